@@ -0,0 +1,109 @@
+"""Streaming ZIP export of an event's photos.
+
+The archive is written with ``zipfile`` into a sink that can't seek, so
+``zipfile`` emits data descriptors instead of going back to patch headers,
+and every byte can be sent to the client as soon as it is written. Entries
+are stored rather than deflated (JPEGs don't compress) and always carry
+ZIP64 fields, so archives past 4 GB or 65,535 photos stay valid.
+
+Photos are fetched from R2 a few at a time ahead of the writer, so memory
+use depends on the read-ahead window, not on the size of the event. The
+photo list itself (keys and filenames only) is loaded before streaming
+starts: a download can run for longer than a database cursor may sit idle.
+"""
+import asyncio
+import io
+import logging
+import os
+import posixpath
+import zipfile
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FETCH_CONCURRENCY = int(os.getenv('ARCHIVE_FETCH_CONCURRENCY', '4'))
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only, unseekable buffer drained by the response generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _entry_name(photo, used_names):
+    """Name an entry after its upload, keeping names unique within the archive"""
+    name = posixpath.basename(photo.get("filename") or "photo.jpg")
+    if name in used_names:
+        stem, ext = posixpath.splitext(name)
+        name = f"{stem}-{photo['photo_id']}{ext}"
+    used_names.add(name)
+    return name
+
+
+def _read_object(r2_client, bucket_name, s3_key):
+    response = r2_client.get_object(Bucket=bucket_name, Key=s3_key)
+    return response['Body'].read()
+
+
+async def stream_photo_archive(r2_client, bucket_name, photos, concurrency=ARCHIVE_FETCH_CONCURRENCY):
+    """Yield a ZIP archive of ``photos`` (a list of photo documents) in chunks"""
+    sink = _StreamSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+    used_names = set()
+    photos = iter(photos)
+    pending = deque()
+    exhausted = False
+
+    def fill():
+        nonlocal exhausted
+        while not exhausted and len(pending) < concurrency:
+            photo = next(photos, None)
+            if photo is None:
+                exhausted = True
+                return
+            pending.append((photo, asyncio.create_task(
+                asyncio.to_thread(_read_object, r2_client, bucket_name, photo["s3_key"])
+            )))
+
+    try:
+        fill()
+        while pending:
+            photo, fetch = pending.popleft()
+            fill()
+            try:
+                data = await fetch
+            except Exception as e:
+                logger.error(f"Skipping {photo['s3_key']} in archive: {e}")
+                continue
+
+            info = zipfile.ZipInfo(_entry_name(photo, used_names), date_time=photo["uploaded_at"].timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with archive.open(info, 'w', force_zip64=True) as entry:
+                for offset in range(0, len(data), ARCHIVE_CHUNK_SIZE):
+                    entry.write(data[offset:offset + ARCHIVE_CHUNK_SIZE])
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            del data
+            # The entry's data descriptor
+            yield sink.drain()
+
+        archive.close()
+        yield sink.drain()
+    finally:
+        for _, fetch in pending:
+            fetch.cancel()
@@ -0,0 +1,106 @@
+"""Mongo indexes for the app's hot queries, created at startup.
+
+``create_index`` is a no-op for an index that already exists, so running
+``ensure_indexes`` on every start is cheap. With ``DB_EXPLAIN_QUERIES=1`` the
+app also explains each query in ``QUERY_PLANS`` after creating the indexes
+and logs any that would still scan a whole collection.
+"""
+import asyncio
+import logging
+import os
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DB_EXPLAIN_QUERIES = os.getenv('DB_EXPLAIN_QUERIES', '0') == '1'
+
+# (collection, keys, options)
+INDEXES = [
+    # Gallery pages, delta syncs and flipbook renders: event photos in upload order
+    ("photos", [("event_id", ASCENDING), ("uploaded_at", ASCENDING), ("photo_id", ASCENDING)], {}),
+    # Per-device upload limits
+    ("photos", [("event_id", ASCENDING), ("device_id", ASCENDING)], {}),
+    ("photos", [("photo_id", ASCENDING)], {"unique": True}),
+    # Post-upload processing queue
+    ("photos", [("processing_status", ASCENDING), ("uploaded_at", ASCENDING)], {}),
+    ("device_quotas", [("event_id", ASCENDING), ("device_id", ASCENDING)], {"unique": True}),
+    ("events", [("event_id", ASCENDING)], {"unique": True}),
+    ("events", [("share_url", ASCENDING)], {"unique": True}),
+    ("events", [("host_id", ASCENDING)], {}),
+    ("user_sessions", [("session_token", ASCENDING)], {"unique": True}),
+    # Mongo deletes sessions once expires_at has passed
+    ("user_sessions", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("users", [("user_id", ASCENDING)], {"unique": True}),
+    ("users", [("email", ASCENDING)], {"unique": True}),
+    ("flipbook_jobs", [("job_id", ASCENDING)], {"unique": True}),
+    ("flipbook_jobs", [("status", ASCENDING), ("created_at", ASCENDING)], {}),
+    ("flipbook_jobs", [("event_id", ASCENDING), ("status", ASCENDING)], {}),
+]
+
+# Representative shapes of the hot queries, checked by explain_queries
+QUERY_PLANS = [
+    ("event photos page", "photos", {"event_id": "evt_x"}, [("uploaded_at", 1), ("photo_id", 1)]),
+    ("event photos delta", "photos",
+     {"event_id": "evt_x", "uploaded_at": {"$gte": 0}}, [("uploaded_at", 1), ("photo_id", 1)]),
+    ("device photo count", "photos", {"event_id": "evt_x", "device_id": "dev_x"}, None),
+    ("device quota", "device_quotas", {"event_id": "evt_x", "device_id": "dev_x"}, None),
+    ("photo by id", "photos", {"photo_id": "pht_x"}, None),
+    ("claimable photos", "photos", {"processing_status": "pending"}, [("uploaded_at", 1)]),
+    ("event by share_url", "events", {"share_url": "x"}, None),
+    ("event by id and host", "events", {"event_id": "evt_x", "host_id": "user_x"}, None),
+    ("host events", "events", {"host_id": "user_x"}, None),
+    ("session by token", "user_sessions", {"session_token": "x"}, None),
+    ("user by id", "users", {"user_id": "user_x"}, None),
+    ("user by email", "users", {"email": "x"}, None),
+    ("claimable flipbook jobs", "flipbook_jobs", {"status": "queued"}, [("created_at", 1)]),
+    ("active flipbook job for event", "flipbook_jobs", {"event_id": "evt_x", "status": {"$in": ["queued"]}}, None),
+]
+
+
+async def ensure_indexes(db):
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except PyMongoError as e:
+            # e.g. existing duplicates blocking a unique index; keep serving
+            logger.error(f"Could not create index {keys} on {collection}: {e}")
+
+
+def _plan_stages(plan):
+    yield plan.get("stage")
+    for child in plan.get("inputStages", []) + [plan[key] for key in ("inputStage", "queryPlan") if key in plan]:
+        yield from _plan_stages(child)
+
+
+async def explain_queries(db):
+    """Explain each registered query and return the names of those that scan a whole collection"""
+    collection_scans = []
+    for name, collection, query_filter, sort in QUERY_PLANS:
+        command = {"find": collection, "filter": query_filter}
+        if sort:
+            command["sort"] = dict(sort)
+        try:
+            result = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        except PyMongoError as e:
+            logger.warning(f"Could not explain query '{name}': {e}")
+            continue
+        stages = set(_plan_stages(result["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            collection_scans.append(name)
+            logger.warning(f"Query '{name}' on {collection} uses a collection scan")
+        else:
+            logger.info(f"Query '{name}' on {collection}: {', '.join(sorted(s for s in stages if s))}")
+    return collection_scans
+
+
+async def bootstrap_indexes(db):
+    await ensure_indexes(db)
+    if DB_EXPLAIN_QUERIES:
+        await explain_queries(db)
+
+
+def start_index_bootstrap(db):
+    # In the background, so an unreachable Mongo doesn't hold up startup
+    return [asyncio.create_task(bootstrap_indexes(db))]
@@ -0,0 +1,137 @@
+"""Content-addressed cache for derived images (PDF-ready renditions and the like).
+
+Entries are keyed by a hash of everything that determines their bytes, so a
+key never needs invalidating: a new source photo or different target size
+simply hashes to a new key. There are two tiers:
+
+* local disk, shared by every process on the box, evicted least recently
+  used first once it grows past its byte budget;
+* optionally R2, under the ``derived/`` prefix, so a fresh container or a
+  different worker box can still skip the work.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+DERIVED_CACHE_DIR = os.getenv('DERIVED_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'event-lens-derived'))
+DERIVED_CACHE_MAX_BYTES = int(os.getenv('DERIVED_CACHE_MAX_MB', '2048')) * 1024 * 1024
+DERIVED_CACHE_R2 = os.getenv('DERIVED_CACHE_R2', '0') == '1'
+DERIVED_PREFIX = 'derived'
+
+
+def derived_key(*parts):
+    """Stable cache key for the given inputs"""
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class DerivedCache:
+    def __init__(self, namespace, cache_dir=DERIVED_CACHE_DIR, max_bytes=DERIVED_CACHE_MAX_BYTES,
+                 r2_client=None, bucket_name=None):
+        self.namespace = namespace
+        self.root = os.path.join(cache_dir, namespace)
+        self.max_bytes = max_bytes
+        self.r2_client = r2_client
+        self.bucket_name = bucket_name
+        # Bytes written since the last directory scan; other processes write
+        # here too, so this only decides when to rescan
+        self._approx_bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _r2_key(self, key):
+        return f"{DERIVED_PREFIX}/{self.namespace}/{key[:2]}/{key}"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            pass
+        else:
+            try:
+                # Bump mtime so eviction treats this entry as recently used
+                os.utime(path)
+            except OSError:
+                # Evicted since we read it; the bytes are still good
+                pass
+            return data
+
+        if self.r2_client is None:
+            return None
+        try:
+            response = self.r2_client.get_object(Bucket=self.bucket_name, Key=self._r2_key(key))
+            data = response['Body'].read()
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                logger.warning(f"Derived cache R2 read failed: {e}")
+            return None
+        except Exception as e:
+            # Connection errors and the like: treat as a miss, the caller can redo the work
+            logger.warning(f"Derived cache R2 read failed: {e}")
+            return None
+        self._write_local(key, data)
+        return data
+
+    def put(self, key, data, remote=True):
+        """Store an entry; ``remote=False`` keeps it out of the R2 tier"""
+        self._write_local(key, data)
+        if remote and self.r2_client is not None:
+            try:
+                self.r2_client.put_object(Bucket=self.bucket_name, Key=self._r2_key(key), Body=data)
+            except Exception as e:
+                logger.warning(f"Derived cache R2 write failed: {e}")
+
+    def _write_local(self, key, data):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so readers in other processes never see a partial file
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Derived cache write failed: {e}")
+            return
+
+        if self._approx_bytes is None:
+            self._approx_bytes = self._scan_size()
+        else:
+            self._approx_bytes += len(data)
+        if self._approx_bytes > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Delete least recently used entries until usage is down to 90% of the budget"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._approx_bytes = total
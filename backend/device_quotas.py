@@ -0,0 +1,121 @@
+"""Per-device upload quotas.
+
+Each (event, device) pair has one ``device_quotas`` document:
+
+* ``used``: uploads that were tracked;
+* ``reservations``: uploads in flight, one per presigned upload URL handed
+  out, each expiring a while after its URL does.
+
+A presigned URL is only issued if ``used`` plus the live reservations is
+below the event's limit. That check and the reservation happen in a single
+update, so a burst of concurrent requests from one device can never get past
+the limit. Expired reservations (the guest closed the page mid-upload) are
+dropped by that same update, so abandoned uploads give their slot back.
+"""
+import os
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Presigned upload URLs last 10 minutes; leave time to finish the upload and track it
+DEVICE_RESERVATION_SECONDS = int(os.getenv('DEVICE_RESERVATION_SECONDS', '900'))
+
+
+def _quota_filter(event_id, device_id):
+    return {"event_id": event_id, "device_id": device_id}
+
+
+async def _seed_quota(db, event_id, device_id):
+    """Create the quota document for a device from its existing photos"""
+    used = await db.photos.count_documents(_quota_filter(event_id, device_id))
+    try:
+        await db.device_quotas.update_one(
+            _quota_filter(event_id, device_id),
+            {"$setOnInsert": {"used": used, "reservations": []}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another request seeded it first
+        pass
+
+
+def _live_reservations(now):
+    return {"$filter": {"input": "$reservations", "cond": {"$gt": ["$$this.expires_at", now]}}}
+
+
+async def get_device_usage(db, event_id, device_id):
+    """Uploads counted against the device: tracked plus in flight"""
+    now = datetime.now(timezone.utc)
+    quota = await db.device_quotas.find_one(_quota_filter(event_id, device_id), {"_id": 0})
+    if quota is None:
+        await _seed_quota(db, event_id, device_id)
+        quota = await db.device_quotas.find_one(_quota_filter(event_id, device_id), {"_id": 0})
+    live = [r for r in quota["reservations"] if _as_utc(r["expires_at"]) > now]
+    return quota["used"] + len(live)
+
+
+async def reserve_uploads(db, event_id, device_id, max_photos, object_keys):
+    """Reserve slots for as many of ``object_keys`` as the limit allows, in order.
+
+    Returns the keys that got a slot.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=DEVICE_RESERVATION_SECONDS)
+    requested = [{"object_key": key, "expires_at": expires_at} for key in object_keys]
+    free = {"$subtract": [max_photos, {"$add": ["$used", {"$size": "$reservations"}]}]}
+    update = [
+        {"$set": {"reservations": _live_reservations(now)}},
+        {"$set": {"reservations": {"$cond": [
+            {"$gt": [free, 0]},
+            {"$concatArrays": ["$reservations", {"$slice": [{"$literal": requested}, free]}]},
+            "$reservations"
+        ]}}}
+    ]
+
+    for _ in range(2):
+        quota = await db.device_quotas.find_one_and_update(
+            _quota_filter(event_id, device_id),
+            update,
+            projection={"_id": 0, "reservations.object_key": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if quota is not None:
+            reserved = {r["object_key"] for r in quota["reservations"]}
+            return [key for key in object_keys if key in reserved]
+        await _seed_quota(db, event_id, device_id)
+    return []
+
+
+async def reserve_upload(db, event_id, device_id, max_photos, object_key):
+    """Reserve a slot for ``object_key``; False if the device is at its limit"""
+    return bool(await reserve_uploads(db, event_id, device_id, max_photos, [object_key]))
+
+
+async def release_upload(db, event_id, device_id, object_key):
+    """Give back the slot of an upload that won't be tracked"""
+    await db.device_quotas.update_one(
+        _quota_filter(event_id, device_id),
+        {"$pull": {"reservations": {"object_key": object_key}}}
+    )
+
+
+async def confirm_uploads(db, event_id, device_id, object_keys):
+    """Turn the uploads' reservations into used slots.
+
+    An upload whose reservation already lapsed still counts.
+    """
+    await db.device_quotas.update_one(
+        _quota_filter(event_id, device_id),
+        {
+            "$pull": {"reservations": {"object_key": {"$in": list(object_keys)}}},
+            "$inc": {"used": len(object_keys)}
+        }
+    )
+
+
+def _as_utc(moment):
+    # Motor hands back naive datetimes unless the client is tz_aware
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
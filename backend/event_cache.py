@@ -0,0 +1,47 @@
+"""share_url -> event lookups for the guest endpoints.
+
+Every guest request starts by resolving the event's share code, and at a
+busy event hundreds of guests resolve the same few codes at once. Lookups
+are cached in process for a short while, including codes that don't exist
+so a bad link can't hammer Mongo. Code that changes or deletes an event
+calls ``invalidate_share_url``; other app workers pick the change up when
+their entry expires.
+"""
+import os
+
+from cache import TTLCache
+
+SHARE_URL_CACHE_TTL = int(os.getenv('SHARE_URL_CACHE_TTL_SECONDS', '60'))
+SHARE_URL_NEGATIVE_TTL = int(os.getenv('SHARE_URL_NEGATIVE_TTL_SECONDS', '10'))
+SHARE_URL_CACHE_SIZE = int(os.getenv('SHARE_URL_CACHE_SIZE', '10000'))
+
+_MISSING = object()
+
+share_url_cache = TTLCache(SHARE_URL_CACHE_SIZE, ttl=SHARE_URL_CACHE_TTL)
+
+
+async def get_event_by_share_url(db, share_url):
+    """The event document for a share code, or None.
+
+    The returned document is shared between requests; copy it before
+    changing it.
+    """
+    event_doc = share_url_cache.get(share_url)
+    if event_doc is _MISSING:
+        return None
+    if event_doc is not None:
+        return event_doc
+
+    event_doc = await db.events.find_one(
+        {"share_url": share_url},
+        {"_id": 0}
+    )
+    if event_doc is None:
+        share_url_cache.set(share_url, _MISSING, ttl=SHARE_URL_NEGATIVE_TTL)
+    else:
+        share_url_cache.set(share_url, event_doc)
+    return event_doc
+
+
+def invalidate_share_url(share_url):
+    share_url_cache.pop(share_url)
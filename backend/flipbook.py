@@ -0,0 +1,842 @@
+"""Flipbook PDF rendering.
+
+Building a flipbook has two phases. ``plan_flipbook`` lays the event out: it
+turns the photos (with their probed dimensions) into a page plan of plain
+data, where every photo page lists the box each photo goes in. No pixels
+are fetched. The plan's photo pages are then drawn in chunks by
+``render_flipbook_part``, each in its own worker process and needing only
+the photos it shows, and cached by the part of the plan it was drawn from.
+``merge_flipbook_parts`` joins the chunks into the final PDF.
+
+Rendering runs inside the flipbook worker processes, so this module must
+not import the FastAPI app (and with it the Mongo client).
+"""
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, NamedTuple
+
+from PIL import Image, ImageOps
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.colors import HexColor, black, white
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from derived_cache import DERIVED_CACHE_R2, DerivedCache, derived_key
+from image_probe import EXIF_ORIENTATION_TAG, is_quarter_turn
+from storage import get_r2_client
+
+logger = logging.getLogger(__name__)
+
+# Photo prefetch tuning for flipbook generation
+FLIPBOOK_FETCH_CONCURRENCY = int(os.getenv('FLIPBOOK_FETCH_CONCURRENCY', '8'))
+FLIPBOOK_PREFETCH_MAX_BYTES = int(os.getenv('FLIPBOOK_PREFETCH_MAX_MB', '256')) * 1024 * 1024
+
+# Resolution photos are resampled to before embedding, per style. Photos are
+# sized to their slot on the page, so a 4-up collage needs far fewer pixels
+# than a full-page story. Override with e.g. FLIPBOOK_DPI_MINIMALIST_STORY=240.
+FLIPBOOK_PRINT_SETTINGS = {
+    'memory_archive': {'dpi': 200, 'quality': 85},
+    'typography_collage': {'dpi': 150, 'quality': 82},
+    'minimalist_story': {'dpi': 300, 'quality': 90},
+}
+
+def get_print_settings(flipbook_style):
+    settings = dict(FLIPBOOK_PRINT_SETTINGS.get(flipbook_style, FLIPBOOK_PRINT_SETTINGS['memory_archive']))
+    env_key = flipbook_style.upper()
+    settings['dpi'] = int(os.getenv(f'FLIPBOOK_DPI_{env_key}', settings['dpi']))
+    settings['quality'] = int(os.getenv(f'FLIPBOOK_JPEG_QUALITY_{env_key}', settings['quality']))
+    return settings
+
+def box_to_pixels(box, dpi):
+    """Pixel size needed to print a (width, height) box in points at ``dpi``"""
+    width, height = box
+    return max(1, math.ceil(width / 72 * dpi)), max(1, math.ceil(height / 72 * dpi))
+
+def fit_photo(photo, box):
+    """Size of ``photo`` scaled to fit a (width, height) box, keeping its aspect ratio
+
+    Uses the dimensions probed onto the photo document. A photo without them
+    gets the whole box, and is centered in it when drawn.
+    """
+    box_w, box_h = box
+    if not photo.get('width') or not photo.get('height'):
+        return box_w, box_h
+    ratio = photo['width'] / photo['height']
+    if ratio > box_w / box_h:
+        return box_w, box_w / ratio
+    return box_h * ratio, box_h
+
+def photo_slot(photo, index, x, y, width, height):
+    """Where photo number ``index`` of the event goes on a page"""
+    return {
+        "photo": index,
+        "photo_id": photo.get('photo_id'),
+        "s3_key": photo['s3_key'],
+        "x": x, "y": y, "width": width, "height": height
+    }
+
+class PreparedImage(NamedTuple):
+    """A photo ready to embed: its pixel size and JPEG bytes"""
+    width: int
+    height: int
+    data: bytes
+
+    def reader(self):
+        return ImageReader(io.BytesIO(self.data))
+
+def prepare_image(image_data, max_size=None, quality=95):
+    """Turn original photo bytes into a ``PreparedImage``
+
+    With ``max_size`` the image is shrunk to fit within that many pixels.
+    JPEGs are decoded at a reduced scale via ``draft()`` so a 12MP photo
+    headed for a small slot is never fully decoded. The EXIF orientation is
+    applied, since PDF viewers ignore it. Upright RGB JPEGs that already fit
+    are passed through as-is, without decoding or re-encoding.
+    """
+    img = Image.open(io.BytesIO(image_data))
+    orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    width, height = (img.height, img.width) if is_quarter_turn(orientation) else (img.width, img.height)
+    fits = not max_size or (width <= max_size[0] and height <= max_size[1])
+    if img.format == 'JPEG' and img.mode == 'RGB' and fits and orientation == 1:
+        return PreparedImage(img.width, img.height, image_data)
+    if max_size:
+        img.draft('RGB', max_size[::-1] if is_quarter_turn(orientation) else max_size)
+    if orientation != 1:
+        img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGB')
+    if max_size:
+        img.thumbnail(max_size, Image.LANCZOS, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return PreparedImage(img.width, img.height, buffer.getvalue())
+
+def fetch_and_prepare_image(r2_client, bucket_name, s3_key, max_size=None, quality=95, cache=None):
+    """Helper to fetch image from R2 and prepare it for PDF
+
+    With a ``cache`` the prepared rendition is looked up by source key and
+    target size first, so regenerating a flipbook only processes new photos.
+    """
+    if cache is not None:
+        cache_key = derived_key('pdf-rendition', RENDITION_VERSION, s3_key, max_size, quality)
+        data = cache.get(cache_key)
+        if data is not None:
+            with Image.open(io.BytesIO(data)) as img:
+                return PreparedImage(img.width, img.height, data)
+
+    response = r2_client.get_object(Bucket=bucket_name, Key=s3_key)
+    image_data = response['Body'].read()
+    prepared = prepare_image(image_data, max_size, quality)
+
+    if cache is not None:
+        # Pass-through originals stay local; R2 already has them under s3_key
+        cache.put(cache_key, prepared.data, remote=prepared.data is not image_data)
+    return prepared
+
+# Bump when prepare_image output changes so stale renditions are not reused
+RENDITION_VERSION = 2
+
+_rendition_cache = None
+
+def get_rendition_cache(r2_client, bucket_name):
+    """Per-process cache of prepared renditions"""
+    global _rendition_cache
+    if _rendition_cache is None:
+        _rendition_cache = DerivedCache(
+            'pdf-renditions',
+            r2_client=r2_client if DERIVED_CACHE_R2 else None,
+            bucket_name=bucket_name
+        )
+    return _rendition_cache
+
+def _prepared_image_bytes(future):
+    """Size of a finished prefetch, 0 while it is still running or failed"""
+    if not future.done() or future.cancelled() or future.exception() is not None:
+        return 0
+    return len(future.result().data)
+
+def prefetch_images(r2_client, bucket_name, slots, print_settings,
+                    concurrency=FLIPBOOK_FETCH_CONCURRENCY,
+                    max_buffered_bytes=FLIPBOOK_PREFETCH_MAX_BYTES,
+                    progress=None):
+    """Fetch and prepare photos concurrently, yielding futures in page order.
+
+    ``slots`` are the planned photo slots; each image is resampled to fit
+    its slot at the style's ``print_settings``.
+
+    At most ``concurrency`` downloads are in flight, and no new download is
+    started while the prepared images waiting to be drawn exceed
+    ``max_buffered_bytes``. Each future resolves to the ``PreparedImage`` from
+    ``fetch_and_prepare_image`` and re-raises its error on ``result()``,
+    so the renderer can still skip a single broken photo.
+
+    ``progress``, if given, is called with the number of photos handed over.
+    """
+    max_window = concurrency * 4
+    cache = get_rendition_cache(r2_client, bucket_name)
+    pending = deque()
+    next_index = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='flipbook-fetch') as pool:
+        try:
+            while pending or next_index < len(slots):
+                while (
+                    next_index < len(slots)
+                    and len(pending) < max_window
+                    and sum(1 for f in pending if not f.done()) < concurrency
+                    and sum(_prepared_image_bytes(f) for f in pending) < max_buffered_bytes
+                ):
+                    slot = slots[next_index]
+                    pending.append(pool.submit(
+                        fetch_and_prepare_image, r2_client, bucket_name, slot['s3_key'],
+                        box_to_pixels((slot['width'], slot['height']), print_settings['dpi']),
+                        print_settings['quality'], cache
+                    ))
+                    next_index += 1
+                if progress:
+                    progress(1)
+                yield pending.popleft()
+        finally:
+            # Consumer stopped early: drop queued downloads
+            for future in pending:
+                future.cancel()
+
+def plan_memory_archive_pages(photos, page_width, page_height):
+    """Scattered grid layout (2-3 photos per spread)"""
+    margin = 40
+    photos_per_page = 2
+    pages = []
+    for i in range(0, len(photos), photos_per_page):
+        page_photos = photos[i:i + photos_per_page]
+        slots = []
+        for idx, photo in enumerate(page_photos):
+            # Calculate scattered positions; a lone photo on the last page gets the large centered slot
+            if len(page_photos) == 1:
+                img_w = page_width * 0.7
+                img_h = page_height * 0.75
+                x = (page_width - img_w) / 2
+                y = (page_height - img_h) / 2
+            else:
+                img_w = page_width * 0.45
+                img_h = page_height * 0.65
+                if idx == 0:
+                    x = margin + 20
+                    y = page_height - img_h - margin - 30
+                else:
+                    x = page_width - img_w - margin - 20
+                    y = margin + 50
+
+            # Maintain aspect ratio
+            slots.append(photo_slot(photo, i + idx, x, y, *fit_photo(photo, (img_w, img_h))))
+        pages.append({"number": i // photos_per_page + 1, "slots": slots})
+    return pages
+
+def draw_memory_archive_title(c, event_doc, photo_count, page_width, page_height):
+    """Style 1: Memory Archive - Documentary style with scattered grid layout"""
+    margin = 40
+    
+    # Title Page - Dark cinematic style
+    c.setFillColor(HexColor('#0a0a0a'))
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    
+    # Decorative top line
+    c.setStrokeColor(HexColor('#6366f1'))
+    c.setLineWidth(3)
+    c.line(margin, page_height / 2 + 100, page_width - margin, page_height / 2 + 100)
+    
+    # Title
+    c.setFont("Helvetica-Bold", 52)
+    c.setFillColor(white)
+    title_text = event_doc['name']
+    title_width = c.stringWidth(title_text, "Helvetica-Bold", 52)
+    c.drawString((page_width - title_width) / 2, page_height / 2 + 30, title_text)
+    
+    # Subtitle
+    c.setFont("Helvetica", 18)
+    c.setFillColor(HexColor('#a78bfa'))
+    subtitle_text = "MEMORY ARCHIVE"
+    subtitle_width = c.stringWidth(subtitle_text, "Helvetica", 18)
+    c.drawString((page_width - subtitle_width) / 2, page_height / 2 - 10, subtitle_text)
+    
+    # Date
+    c.setFont("Helvetica", 14)
+    c.setFillColor(HexColor('#9ca3af'))
+    date_text = event_doc['date']
+    date_width = c.stringWidth(date_text, "Helvetica", 14)
+    c.drawString((page_width - date_width) / 2, page_height / 2 - 40, date_text)
+    
+    # Photo count badge
+    c.setFont("Helvetica-Bold", 12)
+    photo_count_text = f"{photo_count} MOMENTS CAPTURED"
+    count_width = c.stringWidth(photo_count_text, "Helvetica-Bold", 12)
+    badge_x = (page_width - count_width) / 2 - 15
+    badge_y = page_height / 2 - 80
+    c.setFillColor(HexColor('#6366f1'))
+    c.roundRect(badge_x, badge_y, count_width + 30, 26, 13, fill=1, stroke=0)
+    c.setFillColor(white)
+    c.drawString(badge_x + 15, badge_y + 7, photo_count_text)
+    
+    # Decorative bottom line
+    c.setStrokeColor(HexColor('#6366f1'))
+    c.line(margin, page_height / 2 - 130, page_width - margin, page_height / 2 - 130)
+    c.showPage()
+
+def draw_memory_archive_page(c, page, page_width, page_height, images):
+    """Photo page - Scattered grid layout
+
+    Returns the number of photos that could not be drawn.
+    """
+    margin = 40
+    failed = 0
+
+    # Dark background
+    c.setFillColor(HexColor('#111111'))
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    
+    for slot in page["slots"]:
+        x, y = slot["x"], slot["y"]
+        display_w, display_h = slot["width"], slot["height"]
+        try:
+            img = next(images).result()
+            
+            # Draw polaroid-style frame
+            frame_padding = 8
+            c.setFillColor(white)
+            c.rect(x - frame_padding, y - frame_padding - 25, 
+                   display_w + frame_padding * 2, display_h + frame_padding * 2 + 25, fill=1, stroke=0)
+            
+            c.drawImage(img.reader(), x, y, width=display_w, height=display_h, preserveAspectRatio=True)
+            
+            # Photo number
+            c.setFont("Helvetica", 9)
+            c.setFillColor(HexColor('#666666'))
+            c.drawString(x, y - 18, f"#{slot['photo'] + 1}")
+        except Exception as e:
+            logger.error(f"Memory Archive - Failed to add photo: {e}")
+            failed += 1
+            continue
+    
+    # Page indicator
+    c.setFont("Helvetica", 9)
+    c.setFillColor(HexColor('#666666'))
+    c.drawString(page_width - margin - 20, margin / 2, f"{page['number']}")
+    c.showPage()
+    return failed
+
+def draw_memory_archive_closing(c, event_doc, page_width, page_height):
+    # Closing page
+    c.setFillColor(HexColor('#0a0a0a'))
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    c.setFont("Helvetica-Bold", 36)
+    c.setFillColor(white)
+    end_text = "THE END"
+    end_width = c.stringWidth(end_text, "Helvetica-Bold", 36)
+    c.drawString((page_width - end_width) / 2, page_height / 2 + 10, end_text)
+    c.setFont("Helvetica", 14)
+    c.setFillColor(HexColor('#9ca3af'))
+    thanks_text = f"Thank you for being part of {event_doc['name']}"
+    thanks_width = c.stringWidth(thanks_text, "Helvetica", 14)
+    c.drawString((page_width - thanks_width) / 2, page_height / 2 - 25, thanks_text)
+    c.showPage()
+
+
+def plan_typography_collage_pages(photos, page_width, page_height):
+    """Grid collage with text overlays, 4 photos per page"""
+    margin = 30
+    photos_per_page = 4
+    bg_colors = ['#fbbf24', '#f97316', '#ef4444', '#8b5cf6']
+    overlay_texts = ["LOVE", "JOY", "LIFE", "FUN", "EPIC", "WOW"]
+
+    # Grid positions for up to 4 photos
+    positions = [
+        (margin, page_height / 2 + 20, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
+        (page_width / 2 + margin / 2, page_height / 2 + 20, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
+        (margin, margin + 30, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
+        (page_width / 2 + margin / 2, margin + 30, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
+    ]
+
+    pages = []
+    for i in range(0, len(photos), photos_per_page):
+        page_index = i // photos_per_page
+        slots = []
+        for idx, photo in enumerate(photos[i:i + photos_per_page]):
+            x, y, w, h = positions[idx]
+            # Centered in its cell at its own aspect ratio
+            display_w, display_h = fit_photo(photo, (w, h))
+            slots.append(photo_slot(
+                photo, i + idx, x + (w - display_w) / 2, y + (h - display_h) / 2, display_w, display_h
+            ))
+        pages.append({
+            "number": page_index + 1,
+            "slots": slots,
+            # Alternating background colors
+            "background": bg_colors[page_index % len(bg_colors)],
+            "overlay_text": overlay_texts[page_index % len(overlay_texts)]
+        })
+    return pages
+
+def draw_typography_collage_title(c, event_doc, photo_count, page_width, page_height):
+    """Style 2: Typography Collage - Bold text overlay with artistic arrangement"""
+    
+    # Title Page - Vibrant yellow/gold theme
+    c.setFillColor(HexColor('#f59e0b'))
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    
+    # Large bold title
+    c.setFont("Helvetica-Bold", 72)
+    c.setFillColor(HexColor('#000000'))
+    title_text = event_doc['name'].upper()
+    title_width = c.stringWidth(title_text, "Helvetica-Bold", 72)
+    if title_width > page_width - 80:
+        c.setFont("Helvetica-Bold", 48)
+        title_width = c.stringWidth(title_text, "Helvetica-Bold", 48)
+    c.drawString((page_width - title_width) / 2, page_height / 2 + 40, title_text)
+    
+    # Decorative text elements
+    c.setFont("Helvetica-Bold", 120)
+    c.setFillColor(HexColor('#00000015'))
+    c.drawString(-30, page_height - 120, "MOMENTS")
+    c.drawString(page_width - 350, 30, "CAPTURED")
+    
+    # Date badge
+    c.setFont("Helvetica-Bold", 16)
+    c.setFillColor(HexColor('#000000'))
+    date_text = event_doc['date']
+    c.drawString((page_width - c.stringWidth(date_text, "Helvetica-Bold", 16)) / 2, page_height / 2 - 20, date_text)
+    
+    # Photo count
+    c.setFont("Helvetica", 14)
+    count_text = f"{photo_count} photos"
+    c.drawString((page_width - c.stringWidth(count_text, "Helvetica", 14)) / 2, page_height / 2 - 50, count_text)
+    c.showPage()
+
+def draw_typography_collage_page(c, page, page_width, page_height, images):
+    """Photo page - Grid collage with text overlays
+
+    Returns the number of photos that could not be drawn.
+    """
+    margin = 30
+    failed = 0
+
+    c.setFillColor(HexColor(page["background"]))
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    
+    for slot in page["slots"]:
+        x, y = slot["x"], slot["y"]
+        display_w, display_h = slot["width"], slot["height"]
+        try:
+            img = next(images).result()
+            
+            # White border effect
+            border = 4
+            c.setFillColor(white)
+            c.rect(x - border, y - border, display_w + border * 2, display_h + border * 2, fill=1, stroke=0)
+            
+            c.drawImage(img.reader(), x, y, width=display_w, height=display_h, preserveAspectRatio=True)
+        except Exception as e:
+            logger.error(f"Typography Collage - Failed to add photo: {e}")
+            failed += 1
+            continue
+    
+    # Bold typography overlay
+    c.setFont("Helvetica-Bold", 100)
+    c.setFillColor(HexColor('#00000020'))
+    c.drawString(margin, page_height - 90, page["overlay_text"])
+    
+    # Page number
+    c.setFont("Helvetica-Bold", 12)
+    c.setFillColor(HexColor('#000000'))
+    c.drawString(page_width - margin - 30, margin / 2, f"{page['number']}")
+    c.showPage()
+    return failed
+
+def draw_typography_collage_closing(c, event_doc, page_width, page_height):
+    # Closing page
+    c.setFillColor(HexColor('#000000'))
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    c.setFont("Helvetica-Bold", 64)
+    c.setFillColor(HexColor('#f59e0b'))
+    end_text = "FIN."
+    end_width = c.stringWidth(end_text, "Helvetica-Bold", 64)
+    c.drawString((page_width - end_width) / 2, page_height / 2 + 20, end_text)
+    c.setFont("Helvetica", 16)
+    c.setFillColor(white)
+    thanks_text = event_doc['name']
+    thanks_width = c.stringWidth(thanks_text, "Helvetica", 16)
+    c.drawString((page_width - thanks_width) / 2, page_height / 2 - 30, thanks_text)
+    c.showPage()
+
+
+def plan_minimalist_story_pages(photos, page_width, page_height):
+    """One large photo per page, Instagram story style"""
+    # Large centered image with generous margins
+    img_margin = 60
+    max_w = page_width - img_margin * 2
+    max_h = page_height - img_margin * 2 - 40  # Space for progress bar
+
+    pages = []
+    for idx, photo in enumerate(photos):
+        display_w, display_h = fit_photo(photo, (max_w, max_h))
+        x = (page_width - display_w) / 2
+        y = (page_height - display_h) / 2 + 10
+        pages.append({
+            "number": idx + 1,
+            "slots": [photo_slot(photo, idx, x, y, display_w, display_h)],
+            # Every page shows progress through all the photos
+            "photo_count": len(photos)
+        })
+    return pages
+
+def draw_minimalist_story_title(c, event_doc, photo_count, page_width, page_height):
+    """Style 3: Minimalist Story - Clean Instagram-style with organized layout"""
+    margin = 50
+    
+    # Title Page - Clean white with accent
+    c.setFillColor(white)
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    
+    # Thin accent line at top
+    c.setStrokeColor(HexColor('#000000'))
+    c.setLineWidth(1)
+    c.line(margin, page_height - margin, page_width - margin, page_height - margin)
+    
+    # Clean title
+    c.setFont("Helvetica", 42)
+    c.setFillColor(HexColor('#1a1a1a'))
+    title_text = event_doc['name']
+    title_width = c.stringWidth(title_text, "Helvetica", 42)
+    c.drawString((page_width - title_width) / 2, page_height / 2 + 30, title_text)
+    
+    # Minimal date
+    c.setFont("Helvetica", 14)
+    c.setFillColor(HexColor('#666666'))
+    date_text = event_doc['date']
+    date_width = c.stringWidth(date_text, "Helvetica", 14)
+    c.drawString((page_width - date_width) / 2, page_height / 2 - 10, date_text)
+    
+    # Story dots (like Instagram stories)
+    dot_y = page_height / 2 - 50
+    dot_spacing = 12
+    total_dots = min(photo_count, 10)
+    start_x = (page_width - (total_dots * dot_spacing)) / 2
+    for d in range(total_dots):
+        c.setFillColor(HexColor('#e5e7eb'))
+        c.circle(start_x + d * dot_spacing, dot_y, 3, fill=1, stroke=0)
+    
+    # Accent line at bottom
+    c.line(margin, margin, page_width - margin, margin)
+    
+    # Photo count in corner
+    c.setFont("Helvetica", 10)
+    c.setFillColor(HexColor('#999999'))
+    c.drawString(margin, margin - 15, f"{photo_count} moments")
+    c.showPage()
+
+def draw_minimalist_story_page(c, page, page_width, page_height, images):
+    """Photo page - One large photo, Instagram story style
+
+    Returns the number of photos that could not be drawn.
+    """
+    margin = 50
+    failed = 0
+    idx = page["number"] - 1
+    photo_count = page["photo_count"]
+
+    # White background
+    c.setFillColor(white)
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    
+    for slot in page["slots"]:
+        try:
+            img = next(images).result()
+            c.drawImage(
+                img.reader(), slot["x"], slot["y"], width=slot["width"], height=slot["height"],
+                preserveAspectRatio=True
+            )
+        except Exception as e:
+            logger.error(f"Minimalist Story - Failed to add photo: {e}")
+            failed += 1
+    
+    # Progress bar at top (Instagram stories style)
+    bar_y = page_height - 30
+    bar_height = 3
+    total_width = page_width - margin * 2
+    segment_width = (total_width - (photo_count - 1) * 4) / photo_count
+    
+    for bar_idx in range(photo_count):
+        bar_x = margin + bar_idx * (segment_width + 4)
+        if bar_idx <= idx:
+            c.setFillColor(HexColor('#1a1a1a'))
+        else:
+            c.setFillColor(HexColor('#e5e7eb'))
+        c.roundRect(bar_x, bar_y, segment_width, bar_height, 1.5, fill=1, stroke=0)
+    
+    # Minimal page counter
+    c.setFont("Helvetica", 10)
+    c.setFillColor(HexColor('#999999'))
+    counter_text = f"{idx + 1} / {photo_count}"
+    counter_width = c.stringWidth(counter_text, "Helvetica", 10)
+    c.drawString((page_width - counter_width) / 2, 25, counter_text)
+    
+    c.showPage()
+    return failed
+
+def draw_minimalist_story_closing(c, event_doc, page_width, page_height):
+    # Closing page - Simple and clean
+    c.setFillColor(white)
+    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    
+    c.setFont("Helvetica", 28)
+    c.setFillColor(HexColor('#1a1a1a'))
+    end_text = "The End"
+    end_width = c.stringWidth(end_text, "Helvetica", 28)
+    c.drawString((page_width - end_width) / 2, page_height / 2 + 20, end_text)
+    
+    c.setFont("Helvetica", 12)
+    c.setFillColor(HexColor('#999999'))
+    thanks_text = f"Thanks for viewing {event_doc['name']}"
+    thanks_width = c.stringWidth(thanks_text, "Helvetica", 12)
+    c.drawString((page_width - thanks_width) / 2, page_height / 2 - 15, thanks_text)
+    
+    # Final dot
+    c.setFillColor(HexColor('#1a1a1a'))
+    c.circle(page_width / 2, page_height / 2 - 50, 4, fill=1, stroke=0)
+    c.showPage()
+
+
+class FlipbookStyle(NamedTuple):
+    # (photos, page_width, page_height) -> photo pages
+    plan_pages: Callable
+    # (canvas, page, page_width, page_height, images) -> photos that failed
+    draw_page: Callable
+    draw_title: Callable
+    draw_closing: Callable
+
+
+FLIPBOOK_STYLES = {
+    'memory_archive': FlipbookStyle(
+        plan_memory_archive_pages, draw_memory_archive_page,
+        draw_memory_archive_title, draw_memory_archive_closing
+    ),
+    'typography_collage': FlipbookStyle(
+        plan_typography_collage_pages, draw_typography_collage_page,
+        draw_typography_collage_title, draw_typography_collage_closing
+    ),
+    'minimalist_story': FlipbookStyle(
+        plan_minimalist_story_pages, draw_minimalist_story_page,
+        draw_minimalist_story_title, draw_minimalist_story_closing
+    ),
+}
+
+def plan_flipbook(event_doc, photos, page_size=landscape(A4)):
+    """Lay out the event's flipbook without fetching any photos.
+
+    The plan is plain JSON-compatible data, so it can be hashed for caching,
+    sent to worker processes and inspected before anything is drawn.
+    """
+    flipbook_style = event_doc.get('flipbook_style', 'memory_archive')
+    if flipbook_style not in FLIPBOOK_STYLES:
+        # Style 1: Memory Archive (default)
+        flipbook_style = 'memory_archive'
+    page_width, page_height = page_size
+    return {
+        "style": flipbook_style,
+        "page_size": [page_width, page_height],
+        "event": {"name": event_doc['name'], "date": event_doc['date']},
+        "photo_count": len(photos),
+        "pages": FLIPBOOK_STYLES[flipbook_style].plan_pages(photos, page_width, page_height),
+    }
+
+def estimate_plan(plan):
+    """What rendering ``plan`` will take: pages, photos, and pixels to resample them to"""
+    dpi = get_print_settings(plan['style'])['dpi']
+    pixels = 0
+    for page in plan['pages']:
+        for slot in page['slots']:
+            width, height = box_to_pixels((slot['width'], slot['height']), dpi)
+            pixels += width * height
+    return {
+        # Photo pages plus title and closing
+        "pages": len(plan['pages']) + 2,
+        "photos": plan['photo_count'],
+        "megapixels": round(pixels / 1_000_000, 1)
+    }
+
+# Photo pages per cached chunk. Rebuilding after new uploads re-renders only
+# chunks whose pages changed (normally just the tail) plus title and closing.
+FLIPBOOK_CHUNK_PAGES = int(os.getenv('FLIPBOOK_CHUNK_PAGES', '25'))
+
+# Bump when the drawing code changes so previously rendered chunks are not reused
+FLIPBOOK_RENDER_VERSION = 3
+
+_chunk_cache = None
+
+def get_chunk_cache(r2_client, bucket_name):
+    """Per-process cache of rendered photo-page chunks"""
+    global _chunk_cache
+    if _chunk_cache is None:
+        _chunk_cache = DerivedCache(
+            'flipbook-chunks',
+            r2_client=r2_client if DERIVED_CACHE_R2 else None,
+            bucket_name=bucket_name
+        )
+    return _chunk_cache
+
+def chunk_cache_key(chunk):
+    """Key of a chunk: its part of the plan, plus the settings it is drawn with"""
+    settings = get_print_settings(chunk['style'])
+    return derived_key(
+        'flipbook-chunk', FLIPBOOK_RENDER_VERSION, chunk['style'], chunk['page_size'],
+        settings['dpi'], settings['quality'], json.dumps(chunk['pages'], sort_keys=True)
+    )
+
+def _render_pages(draw, page_size):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=page_size)
+    result = draw(c)
+    c.save()
+    return buffer.getvalue(), result
+
+def render_chunk(chunk, progress=None):
+    """Draw a chunk's photo pages into a standalone PDF.
+
+    Fetches only the photos on those pages. Returns the PDF bytes and the
+    number of photos that could not be drawn.
+    """
+    r2_client = get_r2_client()
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+    style = FLIPBOOK_STYLES[chunk['style']]
+    page_width, page_height = chunk['page_size']
+    pages = chunk['pages']
+
+    images = prefetch_images(
+        r2_client, bucket_name, [slot for page in pages for slot in page['slots']],
+        get_print_settings(chunk['style']), progress=progress
+    )
+    try:
+        return _render_pages(
+            lambda c: sum(style.draw_page(c, page, page_width, page_height, images) for page in pages),
+            chunk['page_size']
+        )
+    finally:
+        images.close()
+
+def plan_chunks(plan):
+    """Split the plan's photo pages into chunks of ``FLIPBOOK_CHUNK_PAGES``
+
+    A chunk holds only what drawing it takes: the style, the page size and
+    its own pages. That keeps what is sent to a worker process small however
+    large the event is.
+    """
+    return [
+        {
+            "style": plan['style'],
+            "page_size": plan['page_size'],
+            "first_page": first_page,
+            "pages": plan['pages'][first_page:first_page + FLIPBOOK_CHUNK_PAGES]
+        }
+        for first_page in range(0, len(plan['pages']), FLIPBOOK_CHUNK_PAGES)
+    ]
+
+def render_flipbook_part(chunk, part_path, progress=None):
+    """Render one chunk of photo pages into ``part_path`` (runs in a worker process)
+
+    Chunks are independent, so a flipbook's chunks can render in parallel,
+    one per worker process. A chunk is reused from the chunk cache when its
+    part of the plan was rendered before. ``progress`` is called with a
+    photo count as photos are drawn.
+
+    Returns the chunk's manifest entry: which photos produced which pages,
+    and whether it was reused from an earlier build.
+    """
+    r2_client = get_r2_client()
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+    chunk_cache = get_chunk_cache(r2_client, bucket_name)
+
+    pages = chunk['pages']
+    key = chunk_cache_key(chunk)
+    photo_ids = [slot['photo_id'] for page in pages for slot in page['slots']]
+    data = chunk_cache.get(key)
+    reused = data is not None
+    if reused:
+        if progress:
+            progress(len(photo_ids))
+    else:
+        data, failed = render_chunk(chunk, progress)
+        # A chunk with missing photos must be retried next time, not cached
+        if failed == 0:
+            chunk_cache.put(key, data)
+
+    with open(part_path, 'wb') as part_file:
+        part_file.write(data)
+    return {
+        "key": key,
+        "first_page": chunk['first_page'],
+        "page_count": len(pages),
+        "first_photo": pages[0]['slots'][0]['photo'],
+        "photo_count": len(photo_ids),
+        "photo_ids": photo_ids,
+        "reused": reused
+    }
+
+def merge_flipbook_parts(plan, part_paths, pdf_path):
+    """Write the flipbook to ``pdf_path``: title, the rendered parts in order, closing
+
+    Only the plan's style, page size, event and photo count are used; its
+    pages are already drawn in the parts. Each part is a standalone PDF with
+    its own copy of any object another part also uses (fonts, and the image
+    of a photo shown more than once), so identical objects are collapsed
+    into one after merging.
+    """
+    style = FLIPBOOK_STYLES[plan['style']]
+    page_width, page_height = plan['page_size']
+
+    writer = PdfWriter()
+    writer.append(PdfReader(io.BytesIO(_render_pages(
+        lambda c: style.draw_title(c, plan['event'], plan['photo_count'], page_width, page_height),
+        plan['page_size']
+    )[0])))
+    for part_path in part_paths:
+        writer.append(PdfReader(part_path))
+    writer.append(PdfReader(io.BytesIO(_render_pages(
+        lambda c: style.draw_closing(c, plan['event'], page_width, page_height), plan['page_size']
+    )[0])))
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    with open(pdf_path, 'wb') as pdf_file:
+        writer.write(pdf_file)
+
+
+# Worker processes for PDF rendering, so ReportLab and PIL never run on the
+# event loop; a flipbook's chunks render in parallel across them
+FLIPBOOK_WORKERS = int(os.getenv('FLIPBOOK_WORKERS', str(os.cpu_count() or 2)))
+
+_flipbook_executor = None
+
+def _init_flipbook_worker():
+    logging.basicConfig(level=logging.INFO)
+    # Build the worker's R2 client up front rather than inside the first render
+    get_r2_client()
+
+def get_flipbook_executor():
+    """Process pool shared by all flipbook builds, created on first use"""
+    global _flipbook_executor
+    if _flipbook_executor is None:
+        # spawn instead of fork: the API process has Mongo and HTTP threads running
+        _flipbook_executor = ProcessPoolExecutor(
+            max_workers=FLIPBOOK_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_flipbook_worker,
+        )
+    return _flipbook_executor
+
+def shutdown_flipbook_executor():
+    global _flipbook_executor
+    if _flipbook_executor is not None:
+        _flipbook_executor.shutdown(wait=False, cancel_futures=True)
+        _flipbook_executor = None
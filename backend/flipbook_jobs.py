@@ -0,0 +1,308 @@
+"""Flipbook build jobs.
+
+``POST /events/{event_id}/create-flipbook`` only enqueues a job document in
+the ``flipbook_jobs`` collection; worker loops started with the app claim
+jobs with a lease, lay the flipbook out, render the PDF in the flipbook
+process pool, upload it to R2 and publish it on Heyzine. The job records an
+estimate of the work (pages, photos, megapixels) as soon as it is planned.
+A job whose lease runs out (the worker died or the app restarted) is picked
+up again by the next free worker.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+from pymongo import MongoClient
+
+from event_cache import invalidate_share_url
+from flipbook import (
+    estimate_plan,
+    get_flipbook_executor,
+    merge_flipbook_parts,
+    plan_chunks,
+    plan_flipbook,
+    render_flipbook_part,
+)
+from photo_processing import probe_photos
+from storage import get_r2_client
+from work_queue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RENDERING = "rendering"
+JOB_UPLOADING = "uploading"
+JOB_PUBLISHING = "publishing"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+ACTIVE_JOB_STATUSES = [JOB_RENDERING, JOB_UPLOADING, JOB_PUBLISHING]
+
+# Each job spreads its chunks over every flipbook worker process
+FLIPBOOK_JOB_CONCURRENCY = int(os.getenv('FLIPBOOK_JOB_CONCURRENCY', '2'))
+FLIPBOOK_JOB_LEASE_SECONDS = int(os.getenv('FLIPBOOK_JOB_LEASE_SECONDS', '120'))
+FLIPBOOK_JOB_MAX_ATTEMPTS = int(os.getenv('FLIPBOOK_JOB_MAX_ATTEMPTS', '3'))
+
+# Fields that are internal to the worker and never returned by the API
+_JOB_PROJECTION = {"_id": 0, "lease_id": 0, "lease_expires_at": 0}
+
+_job_queue = WorkQueue(
+    "Flipbook", "flipbook_jobs",
+    status_field="status",
+    queued=JOB_QUEUED,
+    running_statuses=ACTIVE_JOB_STATUSES,
+    lease_field="lease_expires_at",
+    attempts_field="attempts",
+    lease_seconds=FLIPBOOK_JOB_LEASE_SECONDS,
+    sort=[("created_at", 1)],
+    claim_fields=lambda now: {
+        "lease_id": uuid.uuid4().hex,
+        "progress.photos_done": 0,
+        "started_at": now,
+        "updated_at": now
+    }
+)
+
+
+class JobProgressReporter:
+    """Progress callback that updates a job from inside a worker process.
+
+    Updates are batched to at most one write per second so a 2,000-photo
+    render doesn't turn into 2,000 Mongo writes. Reporters in the same
+    process share one Mongo client.
+    """
+
+    _client = None
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._pending = 0
+        self._last_flush = 0.0
+
+    def __call__(self, count):
+        self._pending += count
+        if time.monotonic() - self._last_flush >= 1.0:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        if JobProgressReporter._client is None:
+            JobProgressReporter._client = MongoClient(os.environ['MONGO_URL'])
+        JobProgressReporter._client[os.environ['DB_NAME']].flipbook_jobs.update_one(
+            {"job_id": self.job_id},
+            {"$inc": {"progress.photos_done": self._pending}}
+        )
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+
+def _render_part_with_progress(chunk, part_path, job_id):
+    progress = JobProgressReporter(job_id)
+    try:
+        return render_flipbook_part(chunk, part_path, progress)
+    finally:
+        progress.flush()
+
+
+async def enqueue_flipbook_job(db, event_doc):
+    """Queue a flipbook build for the event, reusing one that is already pending"""
+    existing = await db.flipbook_jobs.find_one(
+        {"event_id": event_doc["event_id"], "status": {"$in": [JOB_QUEUED] + ACTIVE_JOB_STATUSES}},
+        _JOB_PROJECTION
+    )
+    if existing:
+        return existing
+
+    now = datetime.now(timezone.utc)
+    job_doc = {
+        "job_id": f"fbj_{uuid.uuid4().hex[:12]}",
+        "event_id": event_doc["event_id"],
+        "host_id": event_doc["host_id"],
+        "status": JOB_QUEUED,
+        "progress": {"photos_done": 0, "photos_total": 0},
+        "attempts": 0,
+        "error": None,
+        "flipbook_url": None,
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.flipbook_jobs.insert_one(job_doc)
+    job_doc.pop("_id", None)
+    _job_queue.notify()
+    return job_doc
+
+
+async def get_flipbook_job(db, event_id, job_id, host_id):
+    return await db.flipbook_jobs.find_one(
+        {"job_id": job_id, "event_id": event_id, "host_id": host_id},
+        _JOB_PROJECTION
+    )
+
+
+async def _update_job(db, job, **fields):
+    """Update a job we still hold the lease for"""
+    fields["updated_at"] = datetime.now(timezone.utc)
+    await db.flipbook_jobs.update_one(
+        {"job_id": job["job_id"], "lease_id": job["lease_id"]},
+        {"$set": fields}
+    )
+
+
+async def _keep_lease(db, job):
+    while True:
+        await asyncio.sleep(FLIPBOOK_JOB_LEASE_SECONDS / 3)
+        try:
+            await _update_job(db, job, lease_expires_at=_job_queue.lease_expiry())
+        except Exception as e:
+            # Keep trying: a lapsed lease lets another worker build the job again
+            logger.error(f"Could not renew lease on flipbook job {job['job_id']}: {e}")
+
+
+async def publish_to_heyzine(pdf_url, event_doc):
+    heyzine_api_key = os.getenv('HEYZINE_API_KEY')
+    heyzine_client_id = os.getenv('HEYZINE_CLIENT_ID')
+
+    async with httpx.AsyncClient() as client:
+        heyzine_response = await client.post(
+            'https://heyzine.com/api1/rest',
+            json={
+                'pdf': pdf_url,
+                'client_id': heyzine_client_id,
+                'template': 'dce36e099f71f95449f722bfc227cb4bdd1b30f0.pdf',
+                'title': event_doc['name'],
+                'subtitle': f"Event Date: {event_doc['date']}"
+            },
+            headers={
+                'Authorization': f'Bearer {heyzine_api_key}',
+                'Content-Type': 'application/json'
+            },
+            timeout=60.0
+        )
+
+    if heyzine_response.status_code != 200:
+        logger.error(f"Heyzine API error: Status {heyzine_response.status_code}, Response: {heyzine_response.text}")
+        raise RuntimeError(f"Heyzine API error: {heyzine_response.text}")
+
+    flipbook_data = heyzine_response.json()
+    logger.info(f"Heyzine response: {flipbook_data}")
+    flipbook_url = flipbook_data.get('url') or flipbook_data.get('link')
+
+    if not flipbook_url:
+        logger.error(f"No URL in Heyzine response: {flipbook_data}")
+        raise RuntimeError("Heyzine did not return a flipbook URL")
+
+    return flipbook_url
+
+
+async def _build_flipbook(db, job):
+    event_id = job["event_id"]
+    event_doc = await db.events.find_one({"event_id": event_id}, {"_id": 0})
+    if not event_doc:
+        raise RuntimeError("Event not found")
+
+    # Stable order, so earlier page chunks stay identical as photos are appended
+    photos = await db.photos.find(
+        {"event_id": event_id},
+        {"_id": 0}
+    ).sort([("uploaded_at", 1), ("photo_id", 1)]).to_list(None)
+    if len(photos) == 0:
+        raise RuntimeError("No photos to create flipbook")
+
+    # Layout works from each photo's dimensions, so it needs no pixels
+    await probe_photos(db, photos)
+    plan = plan_flipbook(event_doc, photos)
+    await _update_job(db, job, plan=estimate_plan(plan), **{"progress.photos_total": len(photos)})
+
+    r2_client = get_r2_client()
+    if not r2_client:
+        raise RuntimeError("Storage not configured")
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+
+    with tempfile.TemporaryDirectory(prefix='flipbook-') as work_dir:
+        # Every chunk renders in its own worker process, then one merges them
+        loop = asyncio.get_running_loop()
+        executor = get_flipbook_executor()
+        part_paths = []
+        renders = []
+        for chunk in plan_chunks(plan):
+            part_path = os.path.join(work_dir, f"part-{chunk['first_page']:06d}.pdf")
+            part_paths.append(part_path)
+            # Each task gets only its own slice of the plan
+            renders.append(executor.submit(_render_part_with_progress, chunk, part_path, job["job_id"]))
+        try:
+            chunks = await asyncio.gather(*(asyncio.wrap_future(render) for render in renders))
+        except BaseException:
+            # Drop chunks that haven't started, and let running ones finish
+            # before their output directory is removed
+            for render in renders:
+                render.cancel()
+            await asyncio.to_thread(concurrent.futures.wait, renders)
+            raise
+
+        pdf_path = os.path.join(work_dir, 'flipbook.pdf')
+        # The merge doesn't need the pages, which are most of the plan
+        plan_outline = {key: value for key, value in plan.items() if key != 'pages'}
+        await loop.run_in_executor(executor, merge_flipbook_parts, plan_outline, part_paths, pdf_path)
+
+        await _update_job(
+            db, job,
+            status=JOB_UPLOADING,
+            chunks=chunks,
+            chunks_reused=sum(1 for chunk in chunks if chunk["reused"]),
+            **{"progress.photos_done": len(photos)}
+        )
+        r2_pdf_key = f"events/{event_id}/flipbook_{int(datetime.now(timezone.utc).timestamp())}.pdf"
+        await asyncio.to_thread(
+            r2_client.upload_file,
+            pdf_path,
+            bucket_name,
+            r2_pdf_key,
+            ExtraArgs={'ContentType': 'application/pdf'}
+        )
+
+    r2_public_url = os.getenv('R2_PUBLIC_URL')
+    pdf_url = f"{r2_public_url}/{r2_pdf_key}"
+    logger.info(f"PDF uploaded to: {pdf_url}")
+
+    await _update_job(db, job, status=JOB_PUBLISHING, pdf_url=pdf_url)
+    flipbook_url = await publish_to_heyzine(pdf_url, event_doc)
+
+    await db.events.update_one(
+        {"event_id": event_id},
+        {"$set": {"flipbook_url": flipbook_url, "flipbook_created_at": datetime.now(timezone.utc)}}
+    )
+    invalidate_share_url(event_doc["share_url"])
+    return flipbook_url
+
+
+async def _process_job(db, job):
+    if job["attempts"] > FLIPBOOK_JOB_MAX_ATTEMPTS:
+        await _update_job(db, job, status=JOB_FAILED, error="Gave up after repeated worker failures")
+        return
+
+    lease_keeper = asyncio.create_task(_keep_lease(db, job))
+    try:
+        flipbook_url = await _build_flipbook(db, job)
+    except Exception as e:
+        logger.error(f"Flipbook job {job['job_id']} failed: {e}")
+        await _update_job(db, job, status=JOB_FAILED, error=str(e), finished_at=datetime.now(timezone.utc))
+    else:
+        await _update_job(
+            db, job,
+            status=JOB_DONE,
+            flipbook_url=flipbook_url,
+            finished_at=datetime.now(timezone.utc)
+        )
+    finally:
+        lease_keeper.cancel()
+
+
+def start_flipbook_workers(db):
+    return _job_queue.start_workers(db, _process_job, FLIPBOOK_JOB_CONCURRENCY)
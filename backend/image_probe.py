@@ -0,0 +1,184 @@
+"""Image dimensions and EXIF orientation from the first bytes of a file.
+
+JPEG, PNG and WebP all state their size in a header that comes before any
+compressed pixel data (a JPEG's frame header follows its EXIF block, which
+also holds the orientation), so a short range read of the object is enough
+to lay a photo out without downloading or decoding it.
+"""
+import io
+import os
+from collections import namedtuple
+
+from PIL import Image
+
+# Covers the EXIF block (including its embedded thumbnail) of typical phone photos
+PROBE_BYTES = int(os.getenv('IMAGE_PROBE_BYTES', str(64 * 1024)))
+
+# ``width`` and ``height`` are as displayed, i.e. with the EXIF orientation applied
+ImageInfo = namedtuple('ImageInfo', ['format', 'width', 'height', 'orientation'])
+
+# Start-of-frame markers; C4, C8 and CC share the range but aren't frames
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def is_quarter_turn(orientation):
+    """Whether an EXIF orientation swaps width and height"""
+    return orientation in (5, 6, 7, 8)
+
+
+def _image_info(fmt, width, height, orientation):
+    if is_quarter_turn(orientation):
+        # Rotated a quarter turn
+        width, height = height, width
+    return ImageInfo(fmt, width, height, orientation)
+
+
+def _exif_orientation(tiff):
+    """Orientation tag from a TIFF-structured EXIF block; 1 if absent or malformed"""
+    if tiff[:2] == b'II':
+        order = 'little'
+    elif tiff[:2] == b'MM':
+        order = 'big'
+    else:
+        return 1
+    ifd = int.from_bytes(tiff[4:8], order)
+    if ifd + 2 > len(tiff):
+        return 1
+    for index in range(int.from_bytes(tiff[ifd:ifd + 2], order)):
+        entry = ifd + 2 + index * 12
+        if entry + 12 > len(tiff):
+            break
+        if int.from_bytes(tiff[entry:entry + 2], order) == EXIF_ORIENTATION_TAG:
+            orientation = int.from_bytes(tiff[entry + 8:entry + 10], order)
+            return orientation if 1 <= orientation <= 8 else 1
+    return 1
+
+
+def probe_jpeg(data):
+    """ImageInfo for a JPEG; None if the frame header isn't within ``data``"""
+    if data[:2] != b'\xff\xd8':
+        return None
+    orientation = 1
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            # Not at a marker; skip ahead to the next one
+            offset += 1
+            continue
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Standalone markers carry no length
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan without a frame header
+            return None
+        length = int.from_bytes(data[offset + 2:offset + 4], 'big')
+        segment = data[offset + 4:offset + 2 + length]
+        if marker == 0xE1 and segment[:6] == b'Exif\x00\x00':
+            orientation = _exif_orientation(segment[6:])
+        elif marker in _JPEG_SOF_MARKERS:
+            if len(segment) < 5:
+                return None
+            height = int.from_bytes(segment[1:3], 'big')
+            width = int.from_bytes(segment[3:5], 'big')
+            return _image_info('jpeg', width, height, orientation)
+        offset += 2 + length
+    return None
+
+
+def probe_png(data):
+    """ImageInfo for a PNG; None if its header isn't within ``data``"""
+    if data[:8] != b'\x89PNG\r\n\x1a\n' or data[12:16] != b'IHDR' or len(data) < 24:
+        return None
+    width = int.from_bytes(data[16:20], 'big')
+    height = int.from_bytes(data[20:24], 'big')
+    # An eXIf chunk, if any, must come before the image data
+    orientation = 1
+    offset = 8
+    while offset + 8 <= len(data):
+        length = int.from_bytes(data[offset:offset + 4], 'big')
+        chunk_type = data[offset + 4:offset + 8]
+        if chunk_type == b'IDAT':
+            break
+        if chunk_type == b'eXIf':
+            chunk = data[offset + 8:offset + 8 + length]
+            if len(chunk) < length:
+                return None
+            orientation = _exif_orientation(chunk)
+            break
+        offset += 12 + length
+    return _image_info('png', width, height, orientation)
+
+
+def probe_webp(data):
+    """ImageInfo for a WebP; None if its header isn't within ``data``"""
+    if data[:4] != b'RIFF' or data[8:12] != b'WEBP' or len(data) < 30:
+        return None
+    chunk_type = data[12:16]
+    if chunk_type == b'VP8 ':
+        # Lossy: 14-bit sizes after the frame tag and start code
+        if data[23:26] != b'\x9d\x01\x2a':
+            return None
+        width = int.from_bytes(data[26:28], 'little') & 0x3FFF
+        height = int.from_bytes(data[28:30], 'little') & 0x3FFF
+        return _image_info('webp', width, height, 1)
+    if chunk_type == b'VP8L':
+        # Lossless: 14-bit sizes minus one, packed after the signature byte
+        bits = int.from_bytes(data[21:25], 'little')
+        return _image_info('webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 1)
+    if chunk_type == b'VP8X':
+        flags = data[20]
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        if not flags & 0x08:
+            return _image_info('webp', width, height, 1)
+        # The EXIF chunk usually trails the image data; find it if it's in reach
+        offset = 30
+        while offset + 8 <= len(data):
+            length = int.from_bytes(data[offset + 4:offset + 8], 'little')
+            if data[offset:offset + 4] == b'EXIF':
+                chunk = data[offset + 8:offset + 8 + length]
+                if len(chunk) < length:
+                    return None
+                return _image_info('webp', width, height, _exif_orientation(chunk))
+            offset += 8 + length + (length & 1)
+        return None
+    return None
+
+
+def probe_image(data):
+    """ImageInfo from the leading bytes of an image; None if they aren't enough"""
+    if data[:2] == b'\xff\xd8':
+        return probe_jpeg(data)
+    if data[:4] == b'\x89PNG':
+        return probe_png(data)
+    if data[:4] == b'RIFF':
+        return probe_webp(data)
+    return None
+
+
+def decode_image_info(data):
+    """ImageInfo from a whole image file, for anything the header parsers can't handle"""
+    with Image.open(io.BytesIO(data)) as img:
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        return _image_info((img.format or '').lower(), img.width, img.height, orientation)
+
+
+def read_image_info(r2_client, bucket_name, s3_key):
+    """ImageInfo for an object in R2, reading only its first bytes when possible"""
+    response = r2_client.get_object(Bucket=bucket_name, Key=s3_key, Range=f'bytes=0-{PROBE_BYTES - 1}')
+    head = response['Body'].read()
+    info = probe_image(head)
+    if info is not None:
+        return info
+    if len(head) < PROBE_BYTES:
+        # That was the whole file
+        return decode_image_info(head)
+    data = r2_client.get_object(Bucket=bucket_name, Key=s3_key)['Body'].read()
+    return decode_image_info(data)
@@ -0,0 +1,138 @@
+"""Live feed of photo changes per event, streamed to hosts as Server-Sent Events.
+
+Subscribers are asyncio queues held in this process. With the default
+``local`` backend the upload endpoints publish straight into the feed,
+which is enough when the app runs as a single process. With several app
+workers set ``PHOTO_FEED_BACKEND=change_stream``: every worker then tails a
+Mongo change stream on ``photos`` (this needs a replica set) and publishes
+what it sees, so a host connected to any worker hears about uploads handled
+by any other.
+"""
+import asyncio
+import json
+import logging
+import os
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+PHOTO_FEED_BACKEND = os.getenv('PHOTO_FEED_BACKEND', 'local')
+PHOTO_FEED_MAX_CONNECTIONS_PER_EVENT = int(os.getenv('PHOTO_FEED_MAX_CONNECTIONS_PER_EVENT', '50'))
+PHOTO_FEED_QUEUE_SIZE = 256
+PHOTO_FEED_KEEPALIVE_SECONDS = 15
+
+
+class FeedFull(Exception):
+    """The event already has as many live connections as allowed"""
+
+
+class _Subscriber:
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # Set when the subscriber fell too far behind and was dropped
+        self.lagged = False
+
+
+class PhotoFeed:
+    def __init__(self, max_connections_per_event=PHOTO_FEED_MAX_CONNECTIONS_PER_EVENT,
+                 queue_size=PHOTO_FEED_QUEUE_SIZE):
+        self.max_connections_per_event = max_connections_per_event
+        self.queue_size = queue_size
+        self._subscribers = {}
+
+    def has_subscribers(self, event_id):
+        return bool(self._subscribers.get(event_id))
+
+    def subscribe(self, event_id):
+        subscribers = self._subscribers.setdefault(event_id, set())
+        if len(subscribers) >= self.max_connections_per_event:
+            raise FeedFull(event_id)
+        subscriber = _Subscriber(self.queue_size)
+        subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, event_id, subscriber):
+        subscribers = self._subscribers.get(event_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[event_id]
+
+    def publish(self, event_id, kind, data):
+        """Queue a message for everyone watching the event.
+
+        A subscriber whose queue is full is dropped rather than allowed to hold
+        messages back; its stream ends and the client resyncs on reconnect.
+        """
+        message = (kind, jsonable_encoder(data))
+        for subscriber in list(self._subscribers.get(event_id, ())):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscriber.lagged = True
+                self.unsubscribe(event_id, subscriber)
+
+    async def stream(self, event_id, subscriber):
+        """Yield the subscriber's messages as SSE frames until it disconnects"""
+        try:
+            yield "retry: 3000\n\n"
+            while not subscriber.lagged:
+                try:
+                    kind, data = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=PHOTO_FEED_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Comment line, keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            self.unsubscribe(event_id, subscriber)
+
+    async def watch_changes(self, db, prepare_photo):
+        """Publish inserts into photos seen on a change stream.
+
+        ``prepare_photo`` is called on each new photo document before it is
+        published, e.g. to attach its download URL.
+        """
+        pipeline = [{"$match": {
+            "operationType": "insert",
+            "ns.coll": "photos"
+        }}]
+        resume_after = None
+        while True:
+            try:
+                async with db.watch(pipeline, resume_after=resume_after) as change_stream:
+                    async for change in change_stream:
+                        resume_after = change["_id"]
+                        self._publish_change(change, prepare_photo)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Photo feed change stream failed: {e}")
+                await asyncio.sleep(5)
+
+    def _publish_change(self, change, prepare_photo):
+        doc = change["fullDocument"]
+        doc.pop("_id", None)
+        event_id = doc.get("event_id")
+        if not self.has_subscribers(event_id):
+            return
+        prepare_photo(doc)
+        self.publish(event_id, "photo", doc)
+
+
+photo_feed = PhotoFeed()
+
+
+def publish_locally():
+    """Whether endpoints should publish into the feed themselves"""
+    return PHOTO_FEED_BACKEND != 'change_stream'
+
+
+def start_photo_feed(db, prepare_photo):
+    if PHOTO_FEED_BACKEND != 'change_stream':
+        return []
+    return [asyncio.create_task(photo_feed.watch_changes(db, prepare_photo))]
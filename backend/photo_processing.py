@@ -0,0 +1,217 @@
+"""Post-upload processing of tracked photos.
+
+Tracking an upload only records what the guest's browser reported, so the
+photos collection doubles as a work queue: photos are inserted with
+``processing_status: "pending"`` and, once a worker claims one, it will
+
+* HEAD the object, to check the upload really landed in R2 and record its
+  byte size (a photo that isn't there is marked ``missing``);
+* read its dimensions and EXIF orientation from the file header, so layout
+  code and the gallery can size it without downloading any pixels;
+* build its thumbnail and preview renditions.
+
+An error talking to R2 or Mongo leaves the photo claimed, so it is tried
+again when the lease runs out, up to ``PHOTO_PROCESSING_MAX_ATTEMPTS``. A
+file that can't be decoded is marked ``failed`` straight away.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+from PIL import Image, UnidentifiedImageError
+
+from image_probe import read_image_info
+from renditions import build_renditions
+from storage import get_r2_client
+from work_queue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+PROCESSING_PENDING = "pending"
+PROCESSING_RUNNING = "processing"
+PROCESSING_DONE = "done"
+PROCESSING_MISSING = "missing"
+PROCESSING_FAILED = "failed"
+
+PHOTO_PROCESSING_CONCURRENCY = int(os.getenv('PHOTO_PROCESSING_CONCURRENCY', '4'))
+PHOTO_PROCESSING_LEASE_SECONDS = int(os.getenv('PHOTO_PROCESSING_LEASE_SECONDS', '120'))
+PHOTO_PROCESSING_MAX_ATTEMPTS = int(os.getenv('PHOTO_PROCESSING_MAX_ATTEMPTS', '3'))
+PHOTO_PROBE_CONCURRENCY = int(os.getenv('PHOTO_PROBE_CONCURRENCY', '16'))
+# Threads decoding and encoding renditions, for the workers and the gallery's
+# on-demand builds together; kept apart from the default executor so a burst
+# of builds can't hold up streaming and other small blocking reads
+RENDITION_WORKERS = int(os.getenv('RENDITION_WORKERS', '2'))
+
+_photo_queue = WorkQueue(
+    "Photo processing", "photos",
+    status_field="processing_status",
+    queued=PROCESSING_PENDING,
+    running_statuses=[PROCESSING_RUNNING],
+    lease_field="processing_lease_expires_at",
+    attempts_field="processing_attempts",
+    lease_seconds=PHOTO_PROCESSING_LEASE_SECONDS,
+    sort=[("uploaded_at", 1)],
+    projection={"_id": 0}
+)
+
+# Rendition builds in flight in this process, by photo_id
+_rendition_tasks = {}
+_rendition_executor = None
+
+
+def notify_new_photos():
+    """Wake idle workers after pending photos were inserted"""
+    _photo_queue.notify()
+
+
+def get_rendition_executor():
+    """Thread pool shared by all rendition builds, created on first use"""
+    global _rendition_executor
+    if _rendition_executor is None:
+        _rendition_executor = ThreadPoolExecutor(max_workers=RENDITION_WORKERS, thread_name_prefix='rendition')
+    return _rendition_executor
+
+
+def shutdown_rendition_executor():
+    global _rendition_executor
+    if _rendition_executor is not None:
+        _rendition_executor.shutdown(wait=False, cancel_futures=True)
+        _rendition_executor = None
+
+
+async def _generate_renditions(db, photo_doc):
+    r2_client = get_r2_client()
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+    loop = asyncio.get_running_loop()
+    renditions = await loop.run_in_executor(
+        get_rendition_executor(), build_renditions, r2_client, bucket_name, photo_doc['s3_key']
+    )
+    await db.photos.update_one(
+        {"photo_id": photo_doc["photo_id"]},
+        {"$set": {"renditions": renditions}}
+    )
+    return renditions
+
+
+def generate_renditions(db, photo_doc):
+    """Build a photo's renditions, sharing the work with any build already running"""
+    photo_id = photo_doc["photo_id"]
+    task = _rendition_tasks.get(photo_id)
+    if task is None:
+        task = asyncio.create_task(_generate_renditions(db, photo_doc))
+        _rendition_tasks[photo_id] = task
+        task.add_done_callback(lambda _: _rendition_tasks.pop(photo_id, None))
+    return task
+
+
+def _image_fields(info):
+    return {
+        "format": info.format,
+        "width": info.width,
+        "height": info.height,
+        "orientation": info.orientation
+    }
+
+
+async def probe_photos(db, photos, concurrency=PHOTO_PROBE_CONCURRENCY):
+    """Fill in ``width``, ``height`` and ``orientation`` on photos that lack them.
+
+    Covers photos the worker hasn't reached yet and ones tracked before it
+    existed. Each probe is a small range read, and the result is saved on the
+    photo document so it only happens once. Photos that can't be probed are
+    left without dimensions, and ones the worker found missing from R2 aren't
+    tried again.
+    """
+    r2_client = get_r2_client()
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe(photo):
+        async with semaphore:
+            try:
+                info = await asyncio.to_thread(read_image_info, r2_client, bucket_name, photo['s3_key'])
+            except Exception as e:
+                logger.error(f"Could not probe {photo['s3_key']}: {e}")
+                return
+        fields = _image_fields(info)
+        photo.update(fields)
+        await db.photos.update_one({"photo_id": photo["photo_id"]}, {"$set": fields})
+
+    await asyncio.gather(*(
+        probe(photo) for photo in photos
+        if (not photo.get("width") or not photo.get("height"))
+        and photo.get("processing_status") != PROCESSING_MISSING
+    ))
+
+
+async def _finish_photo(db, photo_doc, status, **fields):
+    unset = {"processing_lease_expires_at": ""}
+    if "processing_error" not in fields:
+        # Left over from an earlier attempt
+        unset["processing_error"] = ""
+    await db.photos.update_one(
+        {"photo_id": photo_doc["photo_id"], "processing_status": PROCESSING_RUNNING},
+        {"$set": {"processing_status": status, **fields}, "$unset": unset}
+    )
+
+
+async def _process_photo(db, photo_doc):
+    r2_client = get_r2_client()
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+
+    try:
+        head = await asyncio.to_thread(r2_client.head_object, Bucket=bucket_name, Key=photo_doc['s3_key'])
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            logger.warning(f"Tracked photo {photo_doc['photo_id']} has no object at {photo_doc['s3_key']}")
+            await _finish_photo(db, photo_doc, PROCESSING_MISSING)
+            return
+        raise
+
+    info = await asyncio.to_thread(read_image_info, r2_client, bucket_name, photo_doc['s3_key'])
+    await db.photos.update_one(
+        {"photo_id": photo_doc["photo_id"]},
+        {"$set": {
+            "size_bytes": head['ContentLength'],
+            "content_type": head.get('ContentType'),
+            **_image_fields(info)
+        }}
+    )
+
+    if not photo_doc.get("renditions"):
+        await generate_renditions(db, photo_doc)
+
+    await _finish_photo(db, photo_doc, PROCESSING_DONE, processed_at=datetime.now(timezone.utc))
+
+
+async def _handle_photo(db, photo_doc):
+    if photo_doc["processing_attempts"] > PHOTO_PROCESSING_MAX_ATTEMPTS:
+        await _finish_photo(
+            db, photo_doc, PROCESSING_FAILED,
+            processing_error=photo_doc.get("processing_error") or "Gave up after repeated worker failures"
+        )
+        return
+
+    try:
+        await _process_photo(db, photo_doc)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        # The object isn't an image we can read; trying again won't help
+        logger.error(f"Photo {photo_doc['photo_id']} can't be decoded: {e}")
+        await _finish_photo(db, photo_doc, PROCESSING_FAILED, processing_error=str(e))
+    except Exception as e:
+        # Likely transient (R2 or Mongo); keep the photo claimed so it is
+        # picked up again once its lease runs out, until attempts run out
+        logger.error(f"Processing photo {photo_doc['photo_id']} failed, will retry: {e}")
+        await db.photos.update_one(
+            {"photo_id": photo_doc["photo_id"], "processing_status": PROCESSING_RUNNING},
+            {"$set": {"processing_error": str(e)}}
+        )
+
+
+def start_photo_processing(db):
+    if not get_r2_client():
+        return []
+    return _photo_queue.start_workers(db, _handle_photo, PHOTO_PROCESSING_CONCURRENCY)
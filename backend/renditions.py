@@ -0,0 +1,76 @@
+"""Downscaled renditions of guest photos for the host gallery.
+
+Gallery tiles and the lightbox don't need the full-resolution original, so
+each photo gets a small thumbnail and a screen-sized preview, stored in R2
+next to the other derived data. Renditions are built from a single decode of
+the original, with EXIF orientation applied so they display upright
+everywhere.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from derived_cache import DERIVED_PREFIX
+
+# Longest edge in pixels
+RENDITION_SIZES = {
+    "thumb": 256,
+    "preview": 1024,
+}
+RENDITION_FORMAT = os.getenv('RENDITION_FORMAT', 'webp').lower()
+RENDITION_QUALITY = int(os.getenv('RENDITION_QUALITY', '80'))
+# Bump when rendition output changes, so old objects are not reused
+RENDITION_VERSION = 1
+
+_CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def rendition_key(s3_key, name):
+    return f"{DERIVED_PREFIX}/renditions/v{RENDITION_VERSION}/{name}/{s3_key}.{RENDITION_FORMAT}"
+
+
+def render_renditions(image_data):
+    """Encode every rendition size from one decode of ``image_data``"""
+    largest = max(RENDITION_SIZES.values())
+    with Image.open(io.BytesIO(image_data)) as img:
+        # Let the JPEG decoder downscale by a power of two while decoding
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        renditions = {}
+        # Largest first, each one resampled from the previous
+        for name, size in sorted(RENDITION_SIZES.items(), key=lambda item: -item[1]):
+            img.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            buffer = io.BytesIO()
+            if RENDITION_FORMAT == 'webp':
+                img.save(buffer, 'WEBP', quality=RENDITION_QUALITY, method=4)
+            else:
+                img.save(buffer, 'JPEG', quality=RENDITION_QUALITY, optimize=True, progressive=True)
+            renditions[name] = buffer.getvalue()
+    return renditions
+
+
+def build_renditions(r2_client, bucket_name, s3_key, image_data=None):
+    """Render and upload every rendition of a photo; returns name -> R2 key.
+
+    Pass ``image_data`` if the original has already been downloaded.
+    """
+    if image_data is None:
+        image_data = r2_client.get_object(Bucket=bucket_name, Key=s3_key)['Body'].read()
+
+    keys = {}
+    for name, data in render_renditions(image_data).items():
+        key = rendition_key(s3_key, name)
+        r2_client.put_object(
+            Bucket=bucket_name,
+            Key=key,
+            Body=data,
+            ContentType=_CONTENT_TYPES[RENDITION_FORMAT],
+            # The key changes whenever the content could
+            CacheControl='private, max-age=31536000, immutable'
+        )
+        keys[name] = key
+    return keys
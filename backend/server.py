@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Response, Cookie, Depends
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Cookie, Depends, Query
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -9,21 +9,38 @@ from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
+import asyncio
 from datetime import datetime, timezone, timedelta
 import hashlib
-import boto3
-from botocore.config import Config
+import time
+import base64
+import json
+import re
+from email.utils import format_datetime, parsedate_to_datetime
 from botocore.exceptions import ClientError
 import httpx
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.pdfgen import canvas
-from PIL import Image
-import io
-import tempfile
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+from storage import (
+    ObjectNotModified, ObjectRangeNotSatisfiable, get_r2_client, get_url_signer, iter_object_body, open_object
+)
+from cache import TTLCache
+from flipbook import shutdown_flipbook_executor
+from flipbook_jobs import enqueue_flipbook_job, get_flipbook_job, start_flipbook_workers
+from photo_feed import FeedFull, photo_feed, publish_locally, start_photo_feed
+from db_indexes import start_index_bootstrap
+from archive import stream_photo_archive
+from renditions import RENDITION_SIZES
+from photo_processing import (
+    PROCESSING_PENDING, generate_renditions, notify_new_photos, shutdown_rendition_executor, start_photo_processing
+)
+from event_cache import get_event_by_share_url, invalidate_share_url
+from device_quotas import (
+    confirm_uploads, get_device_usage, release_upload, reserve_upload, reserve_uploads
+)
+
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
@@ -76,30 +93,80 @@ class PresignedURLRequest(BaseModel):
     filename: str
     content_type: str
 
-def get_r2_client():
-    r2_account_id = os.getenv('R2_ACCOUNT_ID')
-    r2_access_key = os.getenv('R2_ACCESS_KEY_ID')
-    r2_secret_key = os.getenv('R2_SECRET_ACCESS_KEY')
+class ReleaseUploadRequest(BaseModel):
+    device_id: str
+    object_key: str
+
+UPLOAD_BATCH_MAX = 20
+
+class PlannedUpload(BaseModel):
+    filename: str
+    content_type: str
+
+class BatchPresignedURLRequest(BaseModel):
+    device_id: str
+    files: List[PlannedUpload] = Field(..., min_length=1, max_length=UPLOAD_BATCH_MAX)
+
+class TrackedUpload(BaseModel):
+    filename: str
+    s3_key: str
+    note: Optional[str] = ""
+
+class BatchTrackUploadRequest(BaseModel):
+    device_id: str
+    photos: List[TrackedUpload] = Field(..., min_length=1, max_length=UPLOAD_BATCH_MAX)
+
+# Authenticated sessions are cached for a short while so most requests skip
+# Mongo; a logout on another app worker takes up to this long to apply here
+SESSION_CACHE_TTL = int(os.getenv('SESSION_CACHE_TTL_SECONDS', '60'))
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+# Fetch the session and its user in one aggregate instead of two queries
+SESSION_LOOKUP_AGGREGATE = os.getenv('SESSION_LOOKUP_AGGREGATE', '1') == '1'
+
+session_cache = TTLCache(SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+async def load_session(session_token: str):
+    """(session_doc, user_doc) for a token; either may be None"""
+    if SESSION_LOOKUP_AGGREGATE:
+        results = await db.user_sessions.aggregate([
+            {"$match": {"session_token": session_token}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": "users",
+                "localField": "user_id",
+                "foreignField": "user_id",
+                "as": "users"
+            }},
+            {"$project": {"_id": 0, "users._id": 0}}
+        ]).to_list(1)
+        if not results:
+            return None, None
+        session_doc = results[0]
+        users = session_doc.pop("users")
+        return session_doc, users[0] if users else None
     
-    if not all([r2_account_id, r2_access_key, r2_secret_key]):
-        return None
+    session_doc = await db.user_sessions.find_one(
+        {"session_token": session_token},
+        {"_id": 0}
+    )
+    if not session_doc:
+        return None, None
     
-    return boto3.client(
-        's3',
-        endpoint_url=f'https://{r2_account_id}.r2.cloudflarestorage.com',
-        aws_access_key_id=r2_access_key,
-        aws_secret_access_key=r2_secret_key,
-        config=Config(signature_version='s3v4')
+    user_doc = await db.users.find_one(
+        {"user_id": session_doc["user_id"]},
+        {"_id": 0}
     )
+    return session_doc, user_doc
 
 async def get_current_user(session_token: Optional[str] = Cookie(None)):
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    session_doc = await db.user_sessions.find_one(
-        {"session_token": session_token},
-        {"_id": 0}
-    )
+    user = session_cache.get(session_token)
+    if user is not None:
+        return user
+    
+    session_doc, user_doc = await load_session(session_token)
     
     if not session_doc:
         raise HTTPException(status_code=401, detail="Invalid session")
@@ -113,15 +180,17 @@ async def get_current_user(session_token: Optional[str] = Cookie(None)):
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
-    user_doc = await db.users.find_one(
-        {"user_id": session_doc["user_id"]},
-        {"_id": 0}
-    )
-    
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    # Never keep a session in the cache past its own expiry
+    session_cache.set(
+        session_token,
+        user,
+        expires_at=min(time.time() + SESSION_CACHE_TTL, expires_at.timestamp())
+    )
+    return user
 
 @api_router.post("/auth/session")
 async def process_session(session_id: str):
@@ -195,6 +264,7 @@ async def get_me(current_user: User = Depends(get_current_user)):
 @api_router.post("/auth/logout")
 async def logout(session_token: Optional[str] = Cookie(None)):
     if session_token:
+        session_cache.pop(session_token)
         await db.user_sessions.delete_one({"session_token": session_token})
     
     response = JSONResponse(content={"message": "Logged out"})
@@ -220,6 +290,8 @@ async def create_event(event_data: EventCreate, current_user: User = Depends(get
     }
     
     await db.events.insert_one(event_doc)
+    # Drop any cached "no such event" for this code
+    invalidate_share_url(share_url)
     return Event(**event_doc)
 
 @api_router.get("/events")
@@ -244,15 +316,132 @@ async def get_event(event_id: str, current_user: User = Depends(get_current_user
 
 @api_router.delete("/events/{event_id}")
 async def delete_event(event_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.events.delete_one({"event_id": event_id, "host_id": current_user.user_id})
+    event_doc = await db.events.find_one_and_delete(
+        {"event_id": event_id, "host_id": current_user.user_id},
+        {"_id": 0, "share_url": 1}
+    )
     
-    if result.deleted_count == 0:
+    if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     
+    invalidate_share_url(event_doc["share_url"])
+    
     return {"message": "Event deleted"}
 
+PHOTOS_PAGE_DEFAULT_LIMIT = 100
+PHOTOS_PAGE_MAX_LIMIT = 500
+
+def encode_photo_cursor(photo):
+    """Opaque keyset cursor pointing just after ``photo`` in (uploaded_at, photo_id) order"""
+    uploaded_at = photo["uploaded_at"]
+    if isinstance(uploaded_at, datetime):
+        uploaded_at = uploaded_at.isoformat()
+    raw = json.dumps([uploaded_at, photo["photo_id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_photo_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        uploaded_at, photo_id = json.loads(raw)
+        return datetime.fromisoformat(uploaded_at), str(photo_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Photos are stamped with uploaded_at before insert_one commits, so a poll can
+# miss a photo stamped just before its watermark; each delta reaches this far
+# back and clients drop photo_ids they already have
+PHOTOS_SYNC_OVERLAP = timedelta(seconds=5)
+
+def encode_sync_watermark(moment: datetime):
+    raw = str(int(moment.timestamp() * 1000)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_sync_watermark(watermark: str):
+    try:
+        raw = base64.urlsafe_b64decode(watermark + "=" * (-len(watermark) % 4))
+        return datetime.fromtimestamp(int(raw) / 1000, tz=timezone.utc)
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+
+# Download URLs are signed as of the start of a fixed window, so every request
+# in the window gets the same URL (and browsers can cache the image), and
+# each URL still has at least PRESIGNED_URL_TTL - PRESIGNED_URL_WINDOW left
+PRESIGNED_URL_TTL = 3600
+PRESIGNED_URL_WINDOW = int(os.getenv('PRESIGNED_URL_WINDOW_SECONDS', '900'))
+PRESIGNED_URL_CACHE_SIZE = int(os.getenv('PRESIGNED_URL_CACHE_SIZE', '50000'))
+
+download_url_cache = TTLCache(PRESIGNED_URL_CACHE_SIZE)
+
+def add_download_urls(photos):
+    """Attach presigned download and rendition URLs to each photo document.
+
+    ``thumb_url`` and ``preview_url`` are None until the photo's renditions
+    exist; clients fall back to the on-demand rendition endpoint.
+    """
+    signer = get_url_signer()
+    if not signer:
+        return
+    
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+    window_start = int(time.time()) // PRESIGNED_URL_WINDOW * PRESIGNED_URL_WINDOW
+    signed_at = datetime.fromtimestamp(window_start, tz=timezone.utc)
+    window_end = window_start + PRESIGNED_URL_WINDOW
+
+    def signed_url(s3_key, disposition=None):
+        cache_key = (s3_key, disposition)
+        url = download_url_cache.get(cache_key)
+        if url is None:
+            params = {'response-cache-control': f'private, max-age={PRESIGNED_URL_TTL}'}
+            if disposition:
+                params['response-content-disposition'] = disposition
+            try:
+                url = signer.presign_get(
+                    bucket_name,
+                    s3_key,
+                    expires_in=PRESIGNED_URL_TTL,
+                    params=params,
+                    now=signed_at
+                )
+            except Exception as e:
+                logger.error(f"Failed to generate download URL: {e}")
+                return None
+            download_url_cache.set(cache_key, url, expires_at=window_end)
+        return url
+
+    for photo in photos:
+        filename = photo.get("filename", "photo.jpg")
+        # Presigned URL with content-disposition for download
+        photo['download_url'] = signed_url(photo['s3_key'], f'attachment; filename="{filename}"')
+        renditions = photo.get('renditions') or {}
+        for name in RENDITION_SIZES:
+            key = renditions.get(name)
+            photo[f'{name}_url'] = signed_url(key) if key else None
+
 @api_router.get("/events/{event_id}/photos")
-async def get_event_photos(event_id: str, current_user: User = Depends(get_current_user)):
+async def get_event_photos(
+    event_id: str,
+    limit: int = Query(PHOTOS_PAGE_DEFAULT_LIMIT, ge=1, le=PHOTOS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """One page of an event's photos, oldest first.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` to get the next page;
+    it is ``None`` on the last page.
+
+    Every response carries a ``watermark``. Passing the one from the first page
+    of a load as ``since`` on a later call limits the result to photos added
+    since then. ``deleted`` is for the ids of photos removed since then; it
+    is always empty, as photos can't be deleted yet.
+
+    ``total`` is only counted on the first page of a full load; it is
+    ``None`` when ``cursor`` or ``since`` is given.
+    """
+    # Taken before querying, so anything committed during the query is
+    # picked up by the next delta
+    watermark = encode_sync_watermark(datetime.now(timezone.utc))
+    
     event_doc = await db.events.find_one(
         {"event_id": event_id, "host_id": current_user.user_id},
         {"_id": 0}
@@ -261,36 +450,120 @@ async def get_event_photos(event_id: str, current_user: User = Depends(get_curre
     if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     
+    query = {"event_id": event_id}
+    if since:
+        query["uploaded_at"] = {"$gte": decode_sync_watermark(since) - PHOTOS_SYNC_OVERLAP}
+    if cursor:
+        uploaded_at, photo_id = decode_photo_cursor(cursor)
+        query["$or"] = [
+            {"uploaded_at": {"$gt": uploaded_at}},
+            {"uploaded_at": uploaded_at, "photo_id": {"$gt": photo_id}}
+        ]
+    
+    # Fetch one extra document to know whether another page follows
     photos = await db.photos.find(
-        {"event_id": event_id},
+        query,
         {"_id": 0}
-    ).to_list(10000)
+    ).sort([("uploaded_at", 1), ("photo_id", 1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(photos) > limit:
+        photos = photos[:limit]
+        next_cursor = encode_photo_cursor(photos[-1])
+    
+    # Counting is a scan of the event's index entries, so only the first page
+    # of a full load does it
+    total = None if since or cursor else await db.photos.count_documents({"event_id": event_id})
+    
+    add_download_urls(photos)
+    
+    return {
+        "photos": photos,
+        "next_cursor": next_cursor,
+        "total": total,
+        "watermark": watermark,
+        "deleted": []
+    }
+
+def prepare_feed_photo(photo):
+    add_download_urls([photo])
+
+@api_router.get("/events/{event_id}/stream")
+async def stream_event_photos(event_id: str, current_user: User = Depends(get_current_user)):
+    """Server-Sent Events: ``photo`` for each new upload"""
+    event_doc = await db.events.find_one(
+        {"event_id": event_id, "host_id": current_user.user_id},
+        {"_id": 0, "event_id": 1}
+    )
+    
+    if not event_doc:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    try:
+        subscriber = photo_feed.subscribe(event_id)
+    except FeedFull:
+        raise HTTPException(status_code=429, detail="Too many live connections for this event")
+    
+    return StreamingResponse(
+        photo_feed.stream(event_id, subscriber),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@api_router.get("/events/{event_id}/archive.zip")
+async def download_event_archive(event_id: str, current_user: User = Depends(get_current_user)):
+    """All of an event's photos as one streamed ZIP"""
+    event_doc = await db.events.find_one(
+        {"event_id": event_id, "host_id": current_user.user_id},
+        {"_id": 0, "name": 1}
+    )
+    
+    if not event_doc:
+        raise HTTPException(status_code=404, detail="Event not found")
     
     r2_client = get_r2_client()
-    if r2_client:
-        bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
-        for photo in photos:
-            try:
-                # Generate presigned URL with content-disposition for download
-                presigned_url = r2_client.generate_presigned_url(
-                    ClientMethod='get_object',
-                    Params={
-                        'Bucket': bucket_name,
-                        'Key': photo['s3_key'],
-                        'ResponseContentDisposition': f'attachment; filename="{photo.get("filename", "photo.jpg")}"'
-                    },
-                    ExpiresIn=3600
-                )
-                photo['download_url'] = presigned_url
-            except Exception as e:
-                logger.error(f"Failed to generate download URL: {e}")
-                photo['download_url'] = None
+    if not r2_client:
+        raise HTTPException(status_code=500, detail="Storage not configured")
     
-    return photos
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+    # Load the list up front: streaming can outlast an idle cursor
+    photos = await db.photos.find(
+        {"event_id": event_id},
+        {"_id": 0, "photo_id": 1, "filename": 1, "s3_key": 1, "uploaded_at": 1}
+    ).sort([("uploaded_at", 1), ("photo_id", 1)]).to_list(None)
+    
+    # Header values must be latin-1; keep the filename to plain ASCII
+    archive_name = re.sub(r'[^A-Za-z0-9_-]+', '-', event_doc["name"]).strip('-') or "event"
+    return StreamingResponse(
+        stream_photo_archive(r2_client, bucket_name, photos),
+        media_type='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{archive_name}-photos.zip"'
+        }
+    )
+
+SINGLE_BYTE_RANGE = re.compile(r'^bytes=(\d+-\d*|-\d+)$')
+
+def http_date(moment: datetime):
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+def matches_validator(response, validator: str):
+    """Whether an If-Range value (ETag or HTTP date) names this version of the object"""
+    if validator == response.get('ETag'):
+        return True
+    last_modified = response.get('LastModified')
+    return last_modified is not None and validator == http_date(last_modified)
 
 @api_router.get("/photos/{photo_id}/download")
-async def download_photo(photo_id: str, current_user: User = Depends(get_current_user)):
-    """Direct download endpoint for individual photos"""
+async def download_photo(photo_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    """Direct download endpoint for individual photos.
+
+    Supports single byte ranges (206) and ETag / Last-Modified revalidation
+    (304), so interrupted downloads can resume.
+    """
     photo_doc = await db.photos.find_one(
         {"photo_id": photo_id},
         {"_id": 0}
@@ -312,31 +585,104 @@ async def download_photo(photo_id: str, current_user: User = Depends(get_current
     if not r2_client:
         raise HTTPException(status_code=500, detail="Storage not configured")
     
+    # Only a single byte range is passed on; anything else gets the whole photo
+    byte_range = request.headers.get('range')
+    if byte_range and not SINGLE_BYTE_RANGE.match(byte_range):
+        byte_range = None
+    if_modified_since = None
+    if request.headers.get('if-modified-since'):
+        try:
+            if_modified_since = parsedate_to_datetime(request.headers['if-modified-since'])
+        except (TypeError, ValueError):
+            pass
+    
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
     try:
-        bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
-        response = r2_client.get_object(Bucket=bucket_name, Key=photo_doc['s3_key'])
-        
-        filename = photo_doc.get('filename', 'photo.jpg')
-        
-        return StreamingResponse(
-            response['Body'],
-            media_type='image/jpeg',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'image/jpeg'
-            }
+        response = await open_object(
+            r2_client, bucket_name, photo_doc['s3_key'],
+            byte_range=byte_range,
+            if_none_match=request.headers.get('if-none-match'),
+            if_modified_since=if_modified_since
         )
+        if_range = request.headers.get('if-range')
+        if byte_range and if_range and not matches_validator(response, if_range):
+            # The client's partial copy is of an older version; send it all again
+            response['Body'].close()
+            byte_range = None
+            response = await open_object(r2_client, bucket_name, photo_doc['s3_key'])
+    except ObjectNotModified:
+        return Response(status_code=304)
+    except ObjectRangeNotSatisfiable:
+        return Response(status_code=416, headers={'Accept-Ranges': 'bytes'})
     except Exception as e:
         logger.error(f"Failed to download photo: {e}")
         raise HTTPException(status_code=500, detail="Failed to download photo")
+    
+    filename = photo_doc.get('filename', 'photo.jpg')
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Content-Length': str(response['ContentLength']),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, max-age=3600'
+    }
+    if response.get('ETag'):
+        headers['ETag'] = response['ETag']
+    if response.get('LastModified'):
+        headers['Last-Modified'] = http_date(response['LastModified'])
+    status_code = 200
+    if byte_range and response.get('ContentRange'):
+        headers['Content-Range'] = response['ContentRange']
+        status_code = 206
+    
+    return StreamingResponse(
+        iter_object_body(response['Body']),
+        status_code=status_code,
+        media_type='image/jpeg',
+        headers=headers
+    )
 
-@api_router.get("/guest/{share_url}")
-async def get_guest_event(share_url: str):
+@api_router.get("/photos/{photo_id}/renditions/{name}")
+async def get_photo_rendition(photo_id: str, name: str, current_user: User = Depends(get_current_user)):
+    """Redirect to a photo's thumbnail or preview, building it on first request"""
+    if name not in RENDITION_SIZES:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    
+    photo_doc = await db.photos.find_one(
+        {"photo_id": photo_id},
+        {"_id": 0}
+    )
+    
+    if not photo_doc:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
     event_doc = await db.events.find_one(
-        {"share_url": share_url},
+        {"event_id": photo_doc["event_id"], "host_id": current_user.user_id},
         {"_id": 0}
     )
     
+    if not event_doc:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if not get_r2_client():
+        raise HTTPException(status_code=500, detail="Storage not configured")
+    
+    if name not in (photo_doc.get("renditions") or {}):
+        try:
+            # Shielded so a client hanging up doesn't abort a build others may be waiting on
+            photo_doc["renditions"] = await asyncio.shield(generate_renditions(db, photo_doc))
+        except Exception as e:
+            logger.error(f"Failed to build renditions: {e}")
+            raise HTTPException(status_code=500, detail="Failed to build rendition")
+    
+    add_download_urls([photo_doc])
+    if not photo_doc.get(f"{name}_url"):
+        raise HTTPException(status_code=500, detail="Failed to generate rendition URL")
+    return RedirectResponse(photo_doc[f"{name}_url"], status_code=302)
+
+@api_router.get("/guest/{share_url}")
+async def get_guest_event(share_url: str):
+    event_doc = await get_event_by_share_url(db, share_url)
+    
     if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     
@@ -344,18 +690,12 @@ async def get_guest_event(share_url: str):
 
 @api_router.get("/guest/{share_url}/limit")
 async def check_device_limit(share_url: str, device_id: str):
-    event_doc = await db.events.find_one(
-        {"share_url": share_url},
-        {"_id": 0, "event_id": 1, "max_photos": 1}
-    )
+    event_doc = await get_event_by_share_url(db, share_url)
     
     if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    photo_count = await db.photos.count_documents({
-        "event_id": event_doc["event_id"],
-        "device_id": device_id
-    })
+    photo_count = await get_device_usage(db, event_doc["event_id"], device_id)
     
     return {
         "used": photo_count,
@@ -363,457 +703,175 @@ async def check_device_limit(share_url: str, device_id: str):
         "remaining": event_doc["max_photos"] - photo_count
     }
 
+UPLOAD_URL_EXPIRES_IN = 600
+
+def guest_object_key(event_id: str, device_id: str, filename: str):
+    timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
+    return f"events/{event_id}/photos/{device_id}/{timestamp}-{filename}"
+
+def presign_upload(r2_client, object_key: str, content_type: str):
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
+    return r2_client.generate_presigned_url(
+        ClientMethod='put_object',
+        Params={
+            'Bucket': bucket_name,
+            'Key': object_key,
+            'ContentType': content_type
+        },
+        ExpiresIn=UPLOAD_URL_EXPIRES_IN
+    )
+
 @api_router.post("/guest/{share_url}/presigned-url")
 async def get_guest_presigned_url(share_url: str, request: PresignedURLRequest):
-    event_doc = await db.events.find_one(
-        {"share_url": share_url},
-        {"_id": 0}
-    )
+    event_doc = await get_event_by_share_url(db, share_url)
     
     if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    photo_count = await db.photos.count_documents({
-        "event_id": event_doc["event_id"],
-        "device_id": request.device_id
-    })
-    
-    if photo_count >= event_doc["max_photos"]:
-        raise HTTPException(status_code=403, detail="Photo limit reached")
-    
     r2_client = get_r2_client()
-    bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
     
     if not r2_client:
         raise HTTPException(status_code=500, detail="Storage not configured")
     
-    timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
-    object_key = f"events/{event_doc['event_id']}/photos/{request.device_id}/{timestamp}-{request.filename}"
+    object_key = guest_object_key(event_doc["event_id"], request.device_id, request.filename)
+    
+    reserved = await reserve_upload(
+        db, event_doc["event_id"], request.device_id, event_doc["max_photos"], object_key
+    )
+    if not reserved:
+        raise HTTPException(status_code=403, detail="Photo limit reached")
     
     try:
-        presigned_url = r2_client.generate_presigned_url(
-            ClientMethod='put_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': object_key,
-                'ContentType': request.content_type
-            },
-            ExpiresIn=600
-        )
+        presigned_url = presign_upload(r2_client, object_key, request.content_type)
         
         return {
             "url": presigned_url,
             "object_key": object_key,
-            "expires_in": 600
+            "expires_in": UPLOAD_URL_EXPIRES_IN
         }
     except ClientError as e:
         logger.error(f"Failed to generate presigned URL: {e}")
+        await release_upload(db, event_doc["event_id"], request.device_id, object_key)
         raise HTTPException(status_code=500, detail="Failed to generate upload URL")
 
-@api_router.post("/guest/{share_url}/track-upload")
-async def track_upload(share_url: str, photo_data: dict):
-    event_doc = await db.events.find_one(
-        {"share_url": share_url},
-        {"_id": 0, "event_id": 1}
-    )
+@api_router.post("/guest/{share_url}/presigned-urls")
+async def get_guest_presigned_urls(share_url: str, request: BatchPresignedURLRequest):
+    """Reserve slots and upload URLs for several shots in one call.
+
+    Returns as many uploads as the device has slots left, in request order;
+    ``remaining`` is how many slots are left after them.
+    """
+    event_doc = await get_event_by_share_url(db, share_url)
     
     if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    photo_doc = {
-        "photo_id": f"pht_{uuid.uuid4().hex[:12]}",
-        "event_id": event_doc["event_id"],
-        "device_id": photo_data["device_id"],
-        "filename": photo_data["filename"],
-        "s3_key": photo_data["s3_key"],
-        "note": photo_data.get("note", ""),
-        "uploaded_at": datetime.now(timezone.utc)
+    r2_client = get_r2_client()
+    
+    if not r2_client:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+    
+    # A batch shares one timestamp, so keep keys apart by position
+    object_keys = [
+        guest_object_key(event_doc["event_id"], request.device_id, f"{index}-{upload.filename}")
+        for index, upload in enumerate(request.files)
+    ]
+    reserved = set(await reserve_uploads(
+        db, event_doc["event_id"], request.device_id, event_doc["max_photos"], object_keys
+    ))
+    if not reserved:
+        raise HTTPException(status_code=403, detail="Photo limit reached")
+    
+    uploads = []
+    for upload, object_key in zip(request.files, object_keys):
+        if object_key not in reserved:
+            continue
+        try:
+            presigned_url = presign_upload(r2_client, object_key, upload.content_type)
+        except ClientError as e:
+            logger.error(f"Failed to generate presigned URL: {e}")
+            await release_upload(db, event_doc["event_id"], request.device_id, object_key)
+            continue
+        uploads.append({
+            "filename": upload.filename,
+            "url": presigned_url,
+            "object_key": object_key
+        })
+    
+    if not uploads:
+        raise HTTPException(status_code=500, detail="Failed to generate upload URLs")
+    
+    used = await get_device_usage(db, event_doc["event_id"], request.device_id)
+    return {
+        "uploads": uploads,
+        "expires_in": UPLOAD_URL_EXPIRES_IN,
+        "remaining": max(event_doc["max_photos"] - used, 0)
     }
+
+@api_router.post("/guest/{share_url}/release-upload")
+async def release_guest_upload(share_url: str, request: ReleaseUploadRequest):
+    """Hand back the slot reserved for an upload the guest abandoned"""
+    event_doc = await get_event_by_share_url(db, share_url)
     
-    await db.photos.insert_one(photo_doc)
+    if not event_doc:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    await release_upload(db, event_doc["event_id"], request.device_id, request.object_key)
     return {"success": True}
 
-from reportlab.lib.colors import HexColor, black, white
-
-def fetch_and_prepare_image(r2_client, bucket_name, s3_key):
-    """Helper to fetch image from R2 and prepare it for PDF"""
-    response = r2_client.get_object(Bucket=bucket_name, Key=s3_key)
-    image_data = response['Body'].read()
-    img = Image.open(io.BytesIO(image_data))
-    if img.mode in ('RGBA', 'LA', 'P'):
-        img = img.convert('RGB')
-    temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-    img.save(temp_file.name, 'JPEG', quality=95)
-    return img, temp_file.name
-
-def generate_memory_archive_pdf(c, photos, event_doc, page_width, page_height, r2_client, bucket_name):
-    """Style 1: Memory Archive - Documentary style with scattered grid layout"""
-    margin = 40
-    
-    # Title Page - Dark cinematic style
-    c.setFillColor(HexColor('#0a0a0a'))
-    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-    
-    # Decorative top line
-    c.setStrokeColor(HexColor('#6366f1'))
-    c.setLineWidth(3)
-    c.line(margin, page_height / 2 + 100, page_width - margin, page_height / 2 + 100)
-    
-    # Title
-    c.setFont("Helvetica-Bold", 52)
-    c.setFillColor(white)
-    title_text = event_doc['name']
-    title_width = c.stringWidth(title_text, "Helvetica-Bold", 52)
-    c.drawString((page_width - title_width) / 2, page_height / 2 + 30, title_text)
-    
-    # Subtitle
-    c.setFont("Helvetica", 18)
-    c.setFillColor(HexColor('#a78bfa'))
-    subtitle_text = "MEMORY ARCHIVE"
-    subtitle_width = c.stringWidth(subtitle_text, "Helvetica", 18)
-    c.drawString((page_width - subtitle_width) / 2, page_height / 2 - 10, subtitle_text)
-    
-    # Date
-    c.setFont("Helvetica", 14)
-    c.setFillColor(HexColor('#9ca3af'))
-    date_text = event_doc['date']
-    date_width = c.stringWidth(date_text, "Helvetica", 14)
-    c.drawString((page_width - date_width) / 2, page_height / 2 - 40, date_text)
-    
-    # Photo count badge
-    c.setFont("Helvetica-Bold", 12)
-    photo_count_text = f"{len(photos)} MOMENTS CAPTURED"
-    count_width = c.stringWidth(photo_count_text, "Helvetica-Bold", 12)
-    badge_x = (page_width - count_width) / 2 - 15
-    badge_y = page_height / 2 - 80
-    c.setFillColor(HexColor('#6366f1'))
-    c.roundRect(badge_x, badge_y, count_width + 30, 26, 13, fill=1, stroke=0)
-    c.setFillColor(white)
-    c.drawString(badge_x + 15, badge_y + 7, photo_count_text)
-    
-    # Decorative bottom line
-    c.setStrokeColor(HexColor('#6366f1'))
-    c.line(margin, page_height / 2 - 130, page_width - margin, page_height / 2 - 130)
-    c.showPage()
-    
-    # Photo pages - Scattered grid layout (2-3 photos per spread)
-    photos_per_page = 2
-    for i in range(0, len(photos), photos_per_page):
-        page_photos = photos[i:i + photos_per_page]
-        
-        # Dark background
-        c.setFillColor(HexColor('#111111'))
-        c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-        
-        for idx, photo in enumerate(page_photos):
-            try:
-                img, temp_path = fetch_and_prepare_image(r2_client, bucket_name, photo['s3_key'])
-                
-                # Calculate scattered positions
-                if len(page_photos) == 1:
-                    img_w = page_width * 0.7
-                    img_h = page_height * 0.75
-                    x = (page_width - img_w) / 2
-                    y = (page_height - img_h) / 2
-                else:
-                    img_w = page_width * 0.45
-                    img_h = page_height * 0.65
-                    if idx == 0:
-                        x = margin + 20
-                        y = page_height - img_h - margin - 30
-                    else:
-                        x = page_width - img_w - margin - 20
-                        y = margin + 50
-                
-                # Maintain aspect ratio
-                img_ratio = img.width / img.height
-                box_ratio = img_w / img_h
-                if img_ratio > box_ratio:
-                    display_w = img_w
-                    display_h = img_w / img_ratio
-                else:
-                    display_h = img_h
-                    display_w = img_h * img_ratio
-                
-                # Draw polaroid-style frame
-                frame_padding = 8
-                c.setFillColor(white)
-                c.rect(x - frame_padding, y - frame_padding - 25, 
-                       display_w + frame_padding * 2, display_h + frame_padding * 2 + 25, fill=1, stroke=0)
-                
-                c.drawImage(temp_path, x, y, width=display_w, height=display_h, preserveAspectRatio=True)
-                
-                # Photo number
-                c.setFont("Helvetica", 9)
-                c.setFillColor(HexColor('#666666'))
-                c.drawString(x, y - 18, f"#{i + idx + 1}")
-                
-                os.unlink(temp_path)
-            except Exception as e:
-                logger.error(f"Memory Archive - Failed to add photo: {e}")
-                continue
-        
-        # Page indicator
-        c.setFont("Helvetica", 9)
-        c.setFillColor(HexColor('#666666'))
-        page_num = f"{(i // photos_per_page) + 1}"
-        c.drawString(page_width - margin - 20, margin / 2, page_num)
-        c.showPage()
-    
-    # Closing page
-    c.setFillColor(HexColor('#0a0a0a'))
-    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-    c.setFont("Helvetica-Bold", 36)
-    c.setFillColor(white)
-    end_text = "THE END"
-    end_width = c.stringWidth(end_text, "Helvetica-Bold", 36)
-    c.drawString((page_width - end_width) / 2, page_height / 2 + 10, end_text)
-    c.setFont("Helvetica", 14)
-    c.setFillColor(HexColor('#9ca3af'))
-    thanks_text = f"Thank you for being part of {event_doc['name']}"
-    thanks_width = c.stringWidth(thanks_text, "Helvetica", 14)
-    c.drawString((page_width - thanks_width) / 2, page_height / 2 - 25, thanks_text)
-    c.showPage()
-
-
-def generate_typography_collage_pdf(c, photos, event_doc, page_width, page_height, r2_client, bucket_name):
-    """Style 2: Typography Collage - Bold text overlay with artistic arrangement"""
-    margin = 30
-    
-    # Title Page - Vibrant yellow/gold theme
-    c.setFillColor(HexColor('#f59e0b'))
-    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-    
-    # Large bold title
-    c.setFont("Helvetica-Bold", 72)
-    c.setFillColor(HexColor('#000000'))
-    title_text = event_doc['name'].upper()
-    title_width = c.stringWidth(title_text, "Helvetica-Bold", 72)
-    if title_width > page_width - 80:
-        c.setFont("Helvetica-Bold", 48)
-        title_width = c.stringWidth(title_text, "Helvetica-Bold", 48)
-    c.drawString((page_width - title_width) / 2, page_height / 2 + 40, title_text)
-    
-    # Decorative text elements
-    c.setFont("Helvetica-Bold", 120)
-    c.setFillColor(HexColor('#00000015'))
-    c.drawString(-30, page_height - 120, "MOMENTS")
-    c.drawString(page_width - 350, 30, "CAPTURED")
-    
-    # Date badge
-    c.setFont("Helvetica-Bold", 16)
-    c.setFillColor(HexColor('#000000'))
-    date_text = event_doc['date']
-    c.drawString((page_width - c.stringWidth(date_text, "Helvetica-Bold", 16)) / 2, page_height / 2 - 20, date_text)
-    
-    # Photo count
-    c.setFont("Helvetica", 14)
-    count_text = f"{len(photos)} photos"
-    c.drawString((page_width - c.stringWidth(count_text, "Helvetica", 14)) / 2, page_height / 2 - 50, count_text)
-    c.showPage()
-    
-    # Photo pages - Grid collage with text overlays
-    photos_per_page = 4
-    for i in range(0, len(photos), photos_per_page):
-        page_photos = photos[i:i + photos_per_page]
-        
-        # Alternating background colors
-        bg_colors = ['#fbbf24', '#f97316', '#ef4444', '#8b5cf6']
-        bg_color = bg_colors[(i // photos_per_page) % len(bg_colors)]
-        c.setFillColor(HexColor(bg_color))
-        c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-        
-        # Grid positions for up to 4 photos
-        positions = [
-            (margin, page_height / 2 + 20, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
-            (page_width / 2 + margin / 2, page_height / 2 + 20, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
-            (margin, margin + 30, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
-            (page_width / 2 + margin / 2, margin + 30, (page_width - margin * 3) / 2, (page_height - margin * 3) / 2 - 20),
-        ]
-        
-        for idx, photo in enumerate(page_photos):
-            if idx >= len(positions):
-                break
-            try:
-                img, temp_path = fetch_and_prepare_image(r2_client, bucket_name, photo['s3_key'])
-                x, y, w, h = positions[idx]
-                
-                # Aspect ratio calculation
-                img_ratio = img.width / img.height
-                box_ratio = w / h
-                if img_ratio > box_ratio:
-                    display_w = w
-                    display_h = w / img_ratio
-                    y = y + (h - display_h) / 2
-                else:
-                    display_h = h
-                    display_w = h * img_ratio
-                    x = x + (w - display_w) / 2
-                
-                # White border effect
-                border = 4
-                c.setFillColor(white)
-                c.rect(x - border, y - border, display_w + border * 2, display_h + border * 2, fill=1, stroke=0)
-                
-                c.drawImage(temp_path, x, y, width=display_w, height=display_h, preserveAspectRatio=True)
-                os.unlink(temp_path)
-            except Exception as e:
-                logger.error(f"Typography Collage - Failed to add photo: {e}")
-                continue
-        
-        # Bold typography overlay
-        c.setFont("Helvetica-Bold", 100)
-        c.setFillColor(HexColor('#00000020'))
-        overlay_texts = ["LOVE", "JOY", "LIFE", "FUN", "EPIC", "WOW"]
-        overlay_text = overlay_texts[(i // photos_per_page) % len(overlay_texts)]
-        c.drawString(margin, page_height - 90, overlay_text)
-        
-        # Page number
-        c.setFont("Helvetica-Bold", 12)
-        c.setFillColor(HexColor('#000000'))
-        c.drawString(page_width - margin - 30, margin / 2, f"{(i // photos_per_page) + 1}")
-        c.showPage()
-    
-    # Closing page
-    c.setFillColor(HexColor('#000000'))
-    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-    c.setFont("Helvetica-Bold", 64)
-    c.setFillColor(HexColor('#f59e0b'))
-    end_text = "FIN."
-    end_width = c.stringWidth(end_text, "Helvetica-Bold", 64)
-    c.drawString((page_width - end_width) / 2, page_height / 2 + 20, end_text)
-    c.setFont("Helvetica", 16)
-    c.setFillColor(white)
-    thanks_text = event_doc['name']
-    thanks_width = c.stringWidth(thanks_text, "Helvetica", 16)
-    c.drawString((page_width - thanks_width) / 2, page_height / 2 - 30, thanks_text)
-    c.showPage()
-
-
-def generate_minimalist_story_pdf(c, photos, event_doc, page_width, page_height, r2_client, bucket_name):
-    """Style 3: Minimalist Story - Clean Instagram-style with organized layout"""
-    margin = 50
-    
-    # Title Page - Clean white with accent
-    c.setFillColor(white)
-    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-    
-    # Thin accent line at top
-    c.setStrokeColor(HexColor('#000000'))
-    c.setLineWidth(1)
-    c.line(margin, page_height - margin, page_width - margin, page_height - margin)
-    
-    # Clean title
-    c.setFont("Helvetica", 42)
-    c.setFillColor(HexColor('#1a1a1a'))
-    title_text = event_doc['name']
-    title_width = c.stringWidth(title_text, "Helvetica", 42)
-    c.drawString((page_width - title_width) / 2, page_height / 2 + 30, title_text)
-    
-    # Minimal date
-    c.setFont("Helvetica", 14)
-    c.setFillColor(HexColor('#666666'))
-    date_text = event_doc['date']
-    date_width = c.stringWidth(date_text, "Helvetica", 14)
-    c.drawString((page_width - date_width) / 2, page_height / 2 - 10, date_text)
-    
-    # Story dots (like Instagram stories)
-    dot_y = page_height / 2 - 50
-    dot_spacing = 12
-    total_dots = min(len(photos), 10)
-    start_x = (page_width - (total_dots * dot_spacing)) / 2
-    for d in range(total_dots):
-        c.setFillColor(HexColor('#e5e7eb'))
-        c.circle(start_x + d * dot_spacing, dot_y, 3, fill=1, stroke=0)
-    
-    # Accent line at bottom
-    c.line(margin, margin, page_width - margin, margin)
-    
-    # Photo count in corner
-    c.setFont("Helvetica", 10)
-    c.setFillColor(HexColor('#999999'))
-    c.drawString(margin, margin - 15, f"{len(photos)} moments")
-    c.showPage()
-    
-    # Photo pages - One large photo per page, Instagram story style
-    for idx, photo in enumerate(photos):
-        # White background
-        c.setFillColor(white)
-        c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-        
-        try:
-            img, temp_path = fetch_and_prepare_image(r2_client, bucket_name, photo['s3_key'])
-            
-            # Large centered image with generous margins
-            img_margin = 60
-            max_w = page_width - img_margin * 2
-            max_h = page_height - img_margin * 2 - 40  # Space for progress bar
-            
-            img_ratio = img.width / img.height
-            box_ratio = max_w / max_h
-            
-            if img_ratio > box_ratio:
-                display_w = max_w
-                display_h = max_w / img_ratio
-            else:
-                display_h = max_h
-                display_w = max_h * img_ratio
-            
-            x = (page_width - display_w) / 2
-            y = (page_height - display_h) / 2 + 10
-            
-            c.drawImage(temp_path, x, y, width=display_w, height=display_h, preserveAspectRatio=True)
-            
-            # Progress bar at top (Instagram stories style)
-            bar_y = page_height - 30
-            bar_height = 3
-            total_width = page_width - margin * 2
-            segment_width = (total_width - (len(photos) - 1) * 4) / len(photos)
-            
-            for bar_idx in range(len(photos)):
-                bar_x = margin + bar_idx * (segment_width + 4)
-                if bar_idx <= idx:
-                    c.setFillColor(HexColor('#1a1a1a'))
-                else:
-                    c.setFillColor(HexColor('#e5e7eb'))
-                c.roundRect(bar_x, bar_y, segment_width, bar_height, 1.5, fill=1, stroke=0)
-            
-            # Minimal page counter
-            c.setFont("Helvetica", 10)
-            c.setFillColor(HexColor('#999999'))
-            counter_text = f"{idx + 1} / {len(photos)}"
-            counter_width = c.stringWidth(counter_text, "Helvetica", 10)
-            c.drawString((page_width - counter_width) / 2, 25, counter_text)
-            
-            os.unlink(temp_path)
-        except Exception as e:
-            logger.error(f"Minimalist Story - Failed to add photo: {e}")
-        
-        c.showPage()
+async def record_uploads(event_id: str, device_id: str, uploads: list):
+    """Insert photo documents for finished uploads and tell live viewers"""
+    now = datetime.now(timezone.utc)
+    photo_docs = [
+        {
+            "photo_id": f"pht_{uuid.uuid4().hex[:12]}",
+            "event_id": event_id,
+            "device_id": device_id,
+            "filename": upload["filename"],
+            "s3_key": upload["s3_key"],
+            "note": upload.get("note", ""),
+            "uploaded_at": now,
+            "processing_status": PROCESSING_PENDING
+        }
+        for upload in uploads
+    ]
+    
+    await db.photos.insert_many(photo_docs)
+    await confirm_uploads(db, event_id, device_id, [photo["s3_key"] for photo in photo_docs])
+    for photo_doc in photo_docs:
+        photo_doc.pop("_id", None)
+    if publish_locally() and photo_feed.has_subscribers(event_id):
+        add_download_urls(photo_docs)
+        for photo_doc in photo_docs:
+            photo_feed.publish(event_id, "photo", photo_doc)
+    notify_new_photos()
+    return photo_docs
+
+@api_router.post("/guest/{share_url}/track-upload")
+async def track_upload(share_url: str, photo_data: dict):
+    event_doc = await get_event_by_share_url(db, share_url)
     
-    # Closing page - Simple and clean
-    c.setFillColor(white)
-    c.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    if not event_doc:
+        raise HTTPException(status_code=404, detail="Event not found")
     
-    c.setFont("Helvetica", 28)
-    c.setFillColor(HexColor('#1a1a1a'))
-    end_text = "The End"
-    end_width = c.stringWidth(end_text, "Helvetica", 28)
-    c.drawString((page_width - end_width) / 2, page_height / 2 + 20, end_text)
+    await record_uploads(event_doc["event_id"], photo_data["device_id"], [photo_data])
+    return {"success": True}
+
+@api_router.post("/guest/{share_url}/track-uploads")
+async def track_uploads(share_url: str, request: BatchTrackUploadRequest):
+    event_doc = await get_event_by_share_url(db, share_url)
     
-    c.setFont("Helvetica", 12)
-    c.setFillColor(HexColor('#999999'))
-    thanks_text = f"Thanks for viewing {event_doc['name']}"
-    thanks_width = c.stringWidth(thanks_text, "Helvetica", 12)
-    c.drawString((page_width - thanks_width) / 2, page_height / 2 - 15, thanks_text)
+    if not event_doc:
+        raise HTTPException(status_code=404, detail="Event not found")
     
-    # Final dot
-    c.setFillColor(HexColor('#1a1a1a'))
-    c.circle(page_width / 2, page_height / 2 - 50, 4, fill=1, stroke=0)
-    c.showPage()
-
+    photo_docs = await record_uploads(
+        event_doc["event_id"],
+        request.device_id,
+        [upload.model_dump() for upload in request.photos]
+    )
+    return {"success": True, "tracked": len(photo_docs)}
 
-@api_router.post("/events/{event_id}/create-flipbook")
+@api_router.post("/events/{event_id}/create-flipbook", status_code=202)
 async def create_flipbook(event_id: str, current_user: User = Depends(get_current_user)):
     event_doc = await db.events.find_one(
         {"event_id": event_id, "host_id": current_user.user_id},
@@ -823,108 +881,27 @@ async def create_flipbook(event_id: str, current_user: User = Depends(get_curren
     if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    photos = await db.photos.find(
-        {"event_id": event_id},
-        {"_id": 0}
-    ).to_list(10000)
+    photo = await db.photos.find_one({"event_id": event_id}, {"_id": 0, "photo_id": 1})
     
-    if len(photos) == 0:
+    if not photo:
         raise HTTPException(status_code=400, detail="No photos to create flipbook")
     
-    try:
-        r2_client = get_r2_client()
-        bucket_name = os.getenv('R2_BUCKET_NAME', 'event-photos')
-        heyzine_api_key = os.getenv('HEYZINE_API_KEY')
-        heyzine_client_id = os.getenv('HEYZINE_CLIENT_ID')
-        
-        if not heyzine_api_key or not heyzine_client_id:
-            raise HTTPException(status_code=500, detail="Heyzine API credentials not configured")
-        
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as pdf_file:
-            pdf_path = pdf_file.name
-            
-            c = canvas.Canvas(pdf_path, pagesize=landscape(A4))
-            page_width, page_height = landscape(A4)
-            
-            flipbook_style = event_doc.get('flipbook_style', 'memory_archive')
-            
-            if flipbook_style == 'typography_collage':
-                # Style 2: Typography Collage with bold text overlay
-                generate_typography_collage_pdf(c, photos, event_doc, page_width, page_height, r2_client, bucket_name)
-            elif flipbook_style == 'minimalist_story':
-                # Style 3: Minimalist Instagram Story style
-                generate_minimalist_story_pdf(c, photos, event_doc, page_width, page_height, r2_client, bucket_name)
-            else:
-                # Style 1: Memory Archive (default)
-                generate_memory_archive_pdf(c, photos, event_doc, page_width, page_height, r2_client, bucket_name)
-            
-            c.save()
-            
-            logger.info(f"PDF generated with style: {flipbook_style}")
-        
-        with open(pdf_path, 'rb') as pdf:
-            pdf_content = pdf.read()
-        
-        r2_pdf_key = f"events/{event_id}/flipbook_{int(datetime.now(timezone.utc).timestamp())}.pdf"
-        r2_client.put_object(
-            Bucket=bucket_name,
-            Key=r2_pdf_key,
-            Body=pdf_content,
-            ContentType='application/pdf'
-        )
-        
-        r2_public_url = os.getenv('R2_PUBLIC_URL')
-        pdf_url = f"{r2_public_url}/{r2_pdf_key}"
-        
-        logger.info(f"PDF uploaded to: {pdf_url}")
-        
-        async with httpx.AsyncClient() as client:
-            heyzine_response = await client.post(
-                'https://heyzine.com/api1/rest',
-                json={
-                    'pdf': pdf_url,
-                    'client_id': heyzine_client_id,
-                    'template': 'dce36e099f71f95449f722bfc227cb4bdd1b30f0.pdf',
-                    'title': event_doc['name'],
-                    'subtitle': f"Event Date: {event_doc['date']}"
-                },
-                headers={
-                    'Authorization': f'Bearer {heyzine_api_key}',
-                    'Content-Type': 'application/json'
-                },
-                timeout=60.0
-            )
-        
-        if heyzine_response.status_code == 200:
-            flipbook_data = heyzine_response.json()
-            logger.info(f"Heyzine response: {flipbook_data}")
-            flipbook_url = flipbook_data.get('url') or flipbook_data.get('link')
-            
-            if not flipbook_url:
-                logger.error(f"No URL in Heyzine response: {flipbook_data}")
-                raise HTTPException(status_code=500, detail="Heyzine did not return a flipbook URL")
-            
-            await db.events.update_one(
-                {"event_id": event_id},
-                {"$set": {"flipbook_url": flipbook_url, "flipbook_created_at": datetime.now(timezone.utc)}}
-            )
-            
-            os.unlink(pdf_path)
-            
-            return {
-                "success": True,
-                "flipbook_url": flipbook_url,
-                "message": "Flipbook created successfully"
-            }
-        else:
-            logger.error(f"Heyzine API error: Status {heyzine_response.status_code}, Response: {heyzine_response.text}")
-            raise HTTPException(status_code=500, detail=f"Failed to create flipbook: {heyzine_response.text}")
+    if not os.getenv('HEYZINE_API_KEY') or not os.getenv('HEYZINE_CLIENT_ID'):
+        raise HTTPException(status_code=500, detail="Heyzine API credentials not configured")
     
-    except Exception as e:
-        logger.error(f"Flipbook creation error: {e}")
-        if 'pdf_path' in locals() and os.path.exists(pdf_path):
-            os.unlink(pdf_path)
-        raise HTTPException(status_code=500, detail=f"Failed to create flipbook: {str(e)}")
+    if not get_r2_client():
+        raise HTTPException(status_code=500, detail="Storage not configured")
+    
+    return await enqueue_flipbook_job(db, event_doc)
+
+@api_router.get("/events/{event_id}/flipbook-jobs/{job_id}")
+async def get_flipbook_job_status(event_id: str, job_id: str, current_user: User = Depends(get_current_user)):
+    job_doc = await get_flipbook_job(db, event_id, job_id, current_user.user_id)
+    
+    if not job_doc:
+        raise HTTPException(status_code=404, detail="Flipbook job not found")
+    
+    return job_doc
 
 app.include_router(api_router)
 
@@ -936,6 +913,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+background_tasks = []
+
+@app.on_event("startup")
+async def start_background_workers():
+    # Build the shared R2 client now instead of on the first request
+    get_r2_client()
+    background_tasks.extend(start_index_bootstrap(db))
+    background_tasks.extend(start_flipbook_workers(db))
+    background_tasks.extend(start_photo_feed(db, prepare_feed_photo))
+    background_tasks.extend(start_photo_processing(db))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task in background_tasks:
+        task.cancel()
+    client.close()
+    shutdown_flipbook_executor()
+    shutdown_rendition_executor()
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""Cloudflare R2 storage access shared by the API and the flipbook workers.
+
+Building a boto3 client parses botocore's service model and opens a fresh
+connection pool, so each process builds one client and shares it; boto3
+clients are safe to use from several threads at once.
+"""
+import asyncio
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from presign import UrlSigner
+
+R2_REGION = os.getenv('R2_REGION', 'auto')
+# Large enough for the flipbook prefetch threads plus concurrent API requests
+R2_MAX_POOL_CONNECTIONS = int(os.getenv('R2_MAX_POOL_CONNECTIONS', '50'))
+R2_MAX_ATTEMPTS = int(os.getenv('R2_MAX_ATTEMPTS', '3'))
+OBJECT_READ_CHUNK_SIZE = 256 * 1024
+
+_r2_client = None
+_r2_client_lock = threading.Lock()
+_url_signer = None
+
+
+def _r2_settings():
+    """(endpoint_url, access_key, secret_key), or None if R2 is not configured"""
+    r2_account_id = os.getenv('R2_ACCOUNT_ID')
+    r2_access_key = os.getenv('R2_ACCESS_KEY_ID')
+    r2_secret_key = os.getenv('R2_SECRET_ACCESS_KEY')
+
+    if not all([r2_account_id, r2_access_key, r2_secret_key]):
+        return None
+
+    return f'https://{r2_account_id}.r2.cloudflarestorage.com', r2_access_key, r2_secret_key
+
+
+def _build_r2_client():
+    settings = _r2_settings()
+    if settings is None:
+        return None
+    endpoint_url, r2_access_key, r2_secret_key = settings
+
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint_url,
+        aws_access_key_id=r2_access_key,
+        aws_secret_access_key=r2_secret_key,
+        region_name=R2_REGION,
+        config=Config(
+            signature_version='s3v4',
+            max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            connect_timeout=5,
+            read_timeout=60,
+            retries={'max_attempts': R2_MAX_ATTEMPTS, 'mode': 'standard'}
+        )
+    )
+
+
+def get_r2_client():
+    """The process-wide R2 client, or None if R2 is not configured"""
+    global _r2_client
+    if _r2_client is None:
+        with _r2_client_lock:
+            if _r2_client is None:
+                _r2_client = _build_r2_client()
+    return _r2_client
+
+
+def get_url_signer():
+    """Signer for presigned GET URLs with the R2 credentials, or None if R2 is not configured"""
+    global _url_signer
+    if _url_signer is None:
+        settings = _r2_settings()
+        if settings is not None:
+            endpoint_url, r2_access_key, r2_secret_key = settings
+            _url_signer = UrlSigner(endpoint_url, r2_access_key, r2_secret_key, R2_REGION)
+    return _url_signer
+
+
+class ObjectNotModified(Exception):
+    """The client's cached copy (If-None-Match / If-Modified-Since) is current"""
+
+
+class ObjectRangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the object"""
+
+
+async def open_object(r2_client, bucket_name, key, byte_range=None, if_none_match=None, if_modified_since=None):
+    """GetObject off the event loop, passing range and cache validators through to R2.
+
+    Returns the boto3 response; its ``Body`` should be read with
+    ``iter_object_body``.
+    """
+    params = {'Bucket': bucket_name, 'Key': key}
+    if byte_range:
+        params['Range'] = byte_range
+    if if_none_match:
+        params['IfNoneMatch'] = if_none_match
+    if if_modified_since:
+        params['IfModifiedSince'] = if_modified_since
+    try:
+        return await asyncio.to_thread(r2_client.get_object, **params)
+    except ClientError as e:
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status == 304:
+            raise ObjectNotModified(key) from e
+        if status == 416:
+            raise ObjectRangeNotSatisfiable(key) from e
+        raise
+
+
+async def iter_object_body(body, chunk_size=OBJECT_READ_CHUNK_SIZE):
+    """Yield a StreamingBody in fixed-size chunks, each read in a worker thread"""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(body.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
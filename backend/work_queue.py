@@ -0,0 +1,110 @@
+"""Background work queued as Mongo documents.
+
+Work is enqueued by inserting a document in its queued status. Worker loops
+started with the app claim documents one at a time with an atomic
+``find_one_and_update`` that moves the document to a running status, sets a
+lease expiry and counts the attempt. A document whose lease runs out before
+it leaves the running statuses (the worker died or the app restarted) is
+claimable again, and handlers give up once the attempt count gets too high.
+
+Idle workers poll every few seconds, and are woken straight away when work
+is enqueued in the same process.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+WORK_QUEUE_POLL_SECONDS = 5
+
+
+class WorkQueue:
+    """Documents in one collection, claimed by worker loops under a lease.
+
+    A document is claimable while ``status_field`` is ``queued``, or while it
+    is in one of ``running_statuses`` with ``lease_field`` in the past.
+    Claiming moves it to ``running_statuses[0]`` and increments
+    ``attempts_field``; ``claim_fields(now)`` adds anything else to set.
+    """
+
+    def __init__(self, name, collection, *, status_field, queued, running_statuses,
+                 lease_field, attempts_field, lease_seconds, sort,
+                 claim_fields=None, projection=None, poll_seconds=WORK_QUEUE_POLL_SECONDS):
+        self.name = name
+        self.collection = collection
+        self.status_field = status_field
+        self.queued = queued
+        self.running_statuses = list(running_statuses)
+        self.lease_field = lease_field
+        self.attempts_field = attempts_field
+        self.lease_seconds = lease_seconds
+        self.sort = sort
+        self.claim_fields = claim_fields
+        self.projection = projection
+        self.poll_seconds = poll_seconds
+        self._wakeup = None
+
+    def notify(self):
+        """Wake idle workers after documents were enqueued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def lease_expiry(self):
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+
+    async def claim(self, db):
+        """Claim the next document in the queue; None if there is none"""
+        now = datetime.now(timezone.utc)
+        return await db[self.collection].find_one_and_update(
+            {"$or": [
+                {self.status_field: self.queued},
+                {self.status_field: {"$in": self.running_statuses}, self.lease_field: {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    self.status_field: self.running_statuses[0],
+                    self.lease_field: now + timedelta(seconds=self.lease_seconds),
+                    **(self.claim_fields(now) if self.claim_fields else {})
+                },
+                "$inc": {self.attempts_field: 1}
+            },
+            projection=self.projection,
+            sort=self.sort,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def run_worker(self, db, handle):
+        """Claim documents and ``await handle(db, doc)`` each one until cancelled"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+
+        while True:
+            try:
+                doc = await self.claim(db)
+            except Exception as e:
+                logger.error(f"{self.name} worker could not claim work: {e}")
+                doc = None
+
+            if doc is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await handle(db, doc)
+            except Exception as e:
+                # Most likely the handler couldn't record its outcome; the
+                # lease runs out and the document is claimed again
+                logger.error(f"{self.name} worker failed handling a claimed document: {e}")
+
+    def start_workers(self, db, handle, count):
+        return [
+            asyncio.create_task(self.run_worker(db, handle))
+            for _ in range(count)
+        ]
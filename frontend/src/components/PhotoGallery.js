@@ -29,10 +29,13 @@ const TwitterIcon = () => (
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
-const PhotoGallery = ({ photos, eventName }) => {
+// Downscaled copy of a photo ('thumb' is 256px, 'preview' 1024px); built on first request if missing
+const renditionUrl = (photo, name) =>
+  photo[`${name}_url`] || `${BACKEND_URL}/api/photos/${photo.photo_id}/renditions/${name}`;
+
+const PhotoGallery = ({ photos, eventId, eventName }) => {
   const [selectedPhoto, setSelectedPhoto] = useState(null);
   const [currentIndex, setCurrentIndex] = useState(0);
-  const [downloading, setDownloading] = useState(false);
   const [showShareMenu, setShowShareMenu] = useState(null); // photo index or null
 
   // Clip path variations for the "cut paper" look
@@ -98,41 +101,16 @@ const PhotoGallery = ({ photos, eventName }) => {
     }
   };
 
-  const downloadAll = async () => {
-    setDownloading(true);
-    toast.info('Preparing download...');
-    
-    try {
-      const JSZip = (await import('jszip')).default;
-      const zip = new JSZip();
-      
-      for (let i = 0; i < photos.length; i++) {
-        const photo = photos[i];
-        try {
-          const response = await fetch(photo.download_url);
-          const blob = await response.blob();
-          zip.file(photo.filename, blob);
-        } catch (error) {
-          console.error(`Failed to download ${photo.filename}`);
-        }
-      }
-      
-      const content = await zip.generateAsync({ type: 'blob' });
-      const url = window.URL.createObjectURL(content);
-      const a = document.createElement('a');
-      a.href = url;
-      a.download = `${eventName.replace(/\s+/g, '-')}-photos.zip`;
-      document.body.appendChild(a);
-      a.click();
-      window.URL.revokeObjectURL(url);
-      document.body.removeChild(a);
-      
-      toast.success('All photos downloaded!');
-    } catch (error) {
-      toast.error('Failed to download photos');
-    } finally {
-      setDownloading(false);
-    }
+  const downloadAll = () => {
+    // The server streams the archive, so the browser saves it as it arrives
+    // instead of holding every photo in memory first
+    const a = document.createElement('a');
+    a.href = `${BACKEND_URL}/api/events/${eventId}/archive.zip`;
+    a.download = `${eventName.replace(/\s+/g, '-')}-photos.zip`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    toast.success('Download started');
   };
 
   // Social sharing functions
@@ -324,7 +302,7 @@ const PhotoGallery = ({ photos, eventName }) => {
           )}
           
           <img 
-            src={selectedPhoto.download_url} 
+            src={renditionUrl(selectedPhoto, 'preview')} 
             alt={selectedPhoto.filename} 
             className="max-h-[60vh] max-w-full object-contain rounded-lg" 
           />
@@ -353,7 +331,7 @@ const PhotoGallery = ({ photos, eventName }) => {
                   index === currentIndex ? 'border-white scale-110' : 'border-transparent opacity-50 hover:opacity-80'
                 }`}
               >
-                <img src={photo.download_url} alt="thumbnail" className="w-full h-full object-cover" />
+                <img src={renditionUrl(photo, 'thumb')} alt="thumbnail" loading="lazy" className="w-full h-full object-cover" />
               </button>
             ))}
           </div>
@@ -373,11 +351,10 @@ const PhotoGallery = ({ photos, eventName }) => {
         
         <button
           onClick={downloadAll}
-          disabled={downloading}
           className="px-6 py-2.5 bg-black text-white rounded-full hover:bg-gray-800 transition-colors text-sm font-medium disabled:opacity-50"
           data-testid="download-all-btn"
         >
-          {downloading ? 'Preparing...' : 'Download All'}
+          Download All
         </button>
       </div>
 
@@ -414,7 +391,11 @@ const PhotoGallery = ({ photos, eventName }) => {
             >
               {photo.download_url ? (
                 <img
-                  src={photo.download_url}
+                  src={renditionUrl(photo, 'preview')}
+                  srcSet={`${renditionUrl(photo, 'thumb')} 256w, ${renditionUrl(photo, 'preview')} 1024w`}
+                  sizes="(max-width: 600px) 100vw, (max-width: 900px) 50vw, 33vw"
+                  width={photo.width}
+                  height={photo.height}
                   alt={photo.filename}
                   className="w-full h-auto grayscale contrast-110 group-hover:grayscale-0 transition-all duration-500"
                   loading="lazy"
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { QRCode } from 'react-qrcode-logo';
@@ -7,6 +7,10 @@ import { toast } from 'sonner';
 import PhotoGallery from '@/components/PhotoGallery';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+// Download URLs are signed for an hour; reload everything well before that
+const FULL_RELOAD_INTERVAL = 30 * 60 * 1000;
+// Stop waiting on a flipbook job after this long; it keeps building on the server
+const FLIPBOOK_POLL_TIMEOUT = 20 * 60 * 1000;
 
 const EventDetails = () => {
   const { eventId } = useParams();
@@ -17,17 +21,50 @@ const EventDetails = () => {
   const [copied, setCopied] = useState(false);
   const [refreshing, setRefreshing] = useState(false);
   const [creatingFlipbook, setCreatingFlipbook] = useState(false);
+  const [flipbookJob, setFlipbookJob] = useState(null);
+  const syncRef = useRef({ watermark: null, loadedAt: 0 });
+  const liveRef = useRef(false);
 
   useEffect(() => {
     loadEvent();
     loadPhotos();
     
+    // New photos are pushed over the live stream; polling only covers gaps
+    // while it is disconnected and the periodic full reload
+    const stream = new EventSource(`${BACKEND_URL}/api/events/${eventId}/stream`, {
+      withCredentials: true
+    });
+    stream.onopen = () => {
+      // Catch up on anything missed while (re)connecting
+      if (syncRef.current.watermark) loadPhotos(true);
+      liveRef.current = true;
+    };
+    stream.onerror = () => {
+      liveRef.current = false;
+    };
+    stream.addEventListener('photo', (message) => {
+      const photo = JSON.parse(message.data);
+      setPhotos((current) => (
+        current.some((existing) => existing.photo_id === photo.photo_id) ? current : current.concat(photo)
+      ));
+    });
+    stream.addEventListener('deleted', (message) => {
+      const { photo_id } = JSON.parse(message.data);
+      setPhotos((current) => current.filter((photo) => photo.photo_id !== photo_id));
+    });
+    
     // Auto-refresh photos every 10 seconds
     const interval = setInterval(() => {
-      loadPhotos(true);
+      if (!liveRef.current || Date.now() - syncRef.current.loadedAt >= FULL_RELOAD_INTERVAL) {
+        loadPhotos(true);
+      }
     }, 10000);
     
-    return () => clearInterval(interval);
+    return () => {
+      clearInterval(interval);
+      stream.close();
+      liveRef.current = false;
+    };
   }, [eventId]);
 
   const loadEvent = async () => {
@@ -44,13 +81,41 @@ const EventDetails = () => {
     }
   };
 
-  const loadPhotos = async (silent = false) => {
-    if (!silent) setRefreshing(true);
-    try {
+  const fetchPhotoPages = async (since) => {
+    const allPhotos = [];
+    let cursor = null;
+    let first = null;
+    do {
       const response = await axios.get(`${BACKEND_URL}/api/events/${eventId}/photos`, {
+        params: { limit: 500, ...(cursor ? { cursor } : {}), ...(since ? { since } : {}) },
         withCredentials: true
       });
-      setPhotos(response.data);
+      first = first || response.data;
+      allPhotos.push(...response.data.photos);
+      cursor = response.data.next_cursor;
+    } while (cursor);
+    return { photos: allPhotos, deleted: first.deleted, watermark: first.watermark };
+  };
+
+  const loadPhotos = async (silent = false) => {
+    if (!silent) setRefreshing(true);
+    try {
+      const sync = syncRef.current;
+      const delta = silent && sync.watermark && Date.now() - sync.loadedAt < FULL_RELOAD_INTERVAL;
+      const result = await fetchPhotoPages(delta ? sync.watermark : null);
+      if (delta) {
+        // Deltas overlap the previous poll slightly, so skip photos we already have
+        setPhotos((current) => {
+          const deleted = new Set(result.deleted);
+          const kept = current.filter((photo) => !deleted.has(photo.photo_id));
+          const known = new Set(kept.map((photo) => photo.photo_id));
+          return kept.concat(result.photos.filter((photo) => !known.has(photo.photo_id)));
+        });
+      } else {
+        setPhotos(result.photos);
+        sync.loadedAt = Date.now();
+      }
+      sync.watermark = result.watermark;
     } catch (error) {
       if (!silent) {
         console.error('Failed to load photos:', error);
@@ -134,6 +199,29 @@ const EventDetails = () => {
         { withCredentials: true }
       );
 
+      let job = response.data;
+      const pollUntil = Date.now() + FLIPBOOK_POLL_TIMEOUT;
+      while (job.status !== 'done' && job.status !== 'failed') {
+        setFlipbookJob(job);
+        if (Date.now() > pollUntil) {
+          toast.info(job.status === 'queued'
+            ? 'Flipbook is still waiting to start. Check back in a few minutes'
+            : 'Flipbook is still being built. Check back in a few minutes');
+          return;
+        }
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        const statusResponse = await axios.get(
+          `${BACKEND_URL}/api/events/${eventId}/flipbook-jobs/${job.job_id}`,
+          { withCredentials: true }
+        );
+        job = statusResponse.data;
+      }
+
+      if (job.status === 'failed') {
+        toast.error(job.error ? `Failed to create flipbook: ${job.error}` : 'Failed to create flipbook');
+        return;
+      }
+
       toast.success('Flipbook created successfully!');
       await loadEvent();
     } catch (error) {
@@ -141,7 +229,21 @@ const EventDetails = () => {
       toast.error(error.response?.data?.detail || 'Failed to create flipbook');
     } finally {
       setCreatingFlipbook(false);
+      setFlipbookJob(null);
+    }
+  };
+
+  const flipbookButtonLabel = () => {
+    if (!creatingFlipbook) {
+      return event.flipbook_url ? 'Recreate Flipbook' : 'Create Flipbook';
+    }
+    if (flipbookJob?.status === 'queued') return 'Queued...';
+    if (flipbookJob?.status === 'rendering' && flipbookJob.progress?.photos_total) {
+      return `Rendering ${flipbookJob.progress.photos_done}/${flipbookJob.progress.photos_total}...`;
     }
+    if (flipbookJob?.status === 'uploading') return 'Uploading...';
+    if (flipbookJob?.status === 'publishing') return 'Publishing...';
+    return 'Creating...';
   };
 
   if (loading) {
@@ -262,7 +364,7 @@ const EventDetails = () => {
                 data-testid="create-flipbook-btn"
               >
                 <BookOpen className="w-4 h-4" />
-                {creatingFlipbook ? 'Creating...' : event.flipbook_url ? 'Recreate Flipbook' : 'Create Flipbook'}
+                {flipbookButtonLabel()}
               </button>
               <button
                 onClick={() => loadPhotos()}
@@ -282,6 +384,7 @@ const EventDetails = () => {
           ) : (
             <PhotoGallery 
               photos={photos} 
+              eventId={eventId}
               eventName={event.name}
             />
           )}
@@ -165,6 +165,40 @@ const GuestCamera = () => {
     }
   };
 
+  const toJpegBlob = async (previewUrl) => {
+    const canvas = document.createElement('canvas');
+    const img = new Image();
+    
+    await new Promise((resolve, reject) => {
+      img.onload = resolve;
+      img.onerror = reject;
+      img.src = previewUrl;
+    });
+
+    const maxSize = 1920;
+    let width = img.width;
+    let height = img.height;
+    
+    if (width > maxSize || height > maxSize) {
+      if (width > height) {
+        height = (height / width) * maxSize;
+        width = maxSize;
+      } else {
+        width = (width / height) * maxSize;
+        height = maxSize;
+      }
+    }
+
+    canvas.width = width;
+    canvas.height = height;
+    const ctx = canvas.getContext('2d');
+    ctx.drawImage(img, 0, 0, width, height);
+
+    return new Promise((resolve) => {
+      canvas.toBlob(resolve, 'image/jpeg', 0.9);
+    });
+  };
+
   const uploadPhotos = async () => {
     if (selectedPhotos.length === 0 || uploading) return;
     
@@ -172,69 +206,53 @@ const GuestCamera = () => {
     let successCount = 0;
 
     try {
-      for (let i = 0; i < selectedPhotos.length; i++) {
-        const { previewUrl, note } = selectedPhotos[i];
-        const filename = `photo_${Date.now()}_${i}.jpg`;
-
-        // Convert to JPEG blob
-        const canvas = document.createElement('canvas');
-        const img = new Image();
-        
-        await new Promise((resolve, reject) => {
-          img.onload = resolve;
-          img.onerror = reject;
-          img.src = previewUrl;
-        });
-
-        const maxSize = 1920;
-        let width = img.width;
-        let height = img.height;
-        
-        if (width > maxSize || height > maxSize) {
-          if (width > height) {
-            height = (height / width) * maxSize;
-            width = maxSize;
-          } else {
-            width = (width / height) * maxSize;
-            height = maxSize;
-          }
+      const shots = await Promise.all(selectedPhotos.map(async ({ previewUrl, note }, i) => ({
+        filename: `photo_${Date.now()}_${i}.jpg`,
+        note: note.trim(),
+        blob: await toJpegBlob(previewUrl)
+      })));
+
+      // One call reserves a slot and an upload URL for every shot
+      const urlResponse = await axios.post(
+        `${BACKEND_URL}/api/guest/${shareUrl}/presigned-urls`,
+        {
+          device_id: deviceId,
+          files: shots.map(({ filename }) => ({ filename, content_type: 'image/jpeg' }))
         }
+      );
+      const uploads = urlResponse.data.uploads;
 
-        canvas.width = width;
-        canvas.height = height;
-        const ctx = canvas.getContext('2d');
-        ctx.drawImage(img, 0, 0, width, height);
-
-        const blob = await new Promise((resolve) => {
-          canvas.toBlob(resolve, 'image/jpeg', 0.9);
+      const results = await Promise.allSettled(uploads.map((upload) => {
+        const shot = shots.find(({ filename }) => filename === upload.filename);
+        return axios.put(upload.url, shot.blob, {
+          headers: { 'Content-Type': 'image/jpeg' }
         });
-
-        const urlResponse = await axios.post(
-          `${BACKEND_URL}/api/guest/${shareUrl}/presigned-url`,
-          {
-            event_id: event.event_id,
+      }));
+
+      const uploaded = [];
+      results.forEach((result, i) => {
+        const upload = uploads[i];
+        if (result.status === 'fulfilled' && result.value.status === 200) {
+          const shot = shots.find(({ filename }) => filename === upload.filename);
+          uploaded.push({ filename: upload.filename, s3_key: upload.object_key, note: shot.note });
+        } else {
+          // Give the reserved slot back so the failed shot doesn't count
+          axios.post(`${BACKEND_URL}/api/guest/${shareUrl}/release-upload`, {
             device_id: deviceId,
-            filename: filename,
-            content_type: 'image/jpeg'
-          }
-        );
+            object_key: upload.object_key
+          }).catch(() => {});
+        }
+      });
 
-        const uploadResponse = await axios.put(urlResponse.data.url, blob, {
-          headers: { 'Content-Type': 'image/jpeg' }
+      if (uploaded.length > 0) {
+        await axios.post(`${BACKEND_URL}/api/guest/${shareUrl}/track-uploads`, {
+          device_id: deviceId,
+          photos: uploaded
         });
-
-        if (uploadResponse.status === 200) {
-          await axios.post(
-            `${BACKEND_URL}/api/guest/${shareUrl}/track-upload`,
-            {
-              device_id: deviceId,
-              filename: filename,
-              s3_key: urlResponse.data.object_key,
-              note: note.trim()
-            }
-          );
-          successCount++;
-        }
+        successCount = uploaded.length;
+      }
+      if (successCount < shots.length) {
+        toast.error('Failed to upload some photos');
       }
 
       if (successCount > 0) {
@@ -0,0 +1,139 @@
+"""
+Test suite for the streamed event archive
+Checks that the ZIP it writes is valid, names entries uniquely and skips
+photos whose objects can't be read
+"""
+import asyncio
+import io
+import os
+import struct
+import sys
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import archive  # noqa: E402
+from archive import stream_photo_archive  # noqa: E402
+
+BUCKET = 'event-photos'
+ZIP64_EXTRA_ID = 0x0001
+
+
+class FakeR2:
+    """Just enough of an S3 client for the archive's object reads"""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+def photo(photo_id, filename, minute=0):
+    return {
+        "photo_id": photo_id,
+        "filename": filename,
+        "s3_key": f"events/evt_1/photos/device/{photo_id}-{filename}",
+        "uploaded_at": datetime(2025, 6, 1, 12, minute, tzinfo=timezone.utc)
+    }
+
+
+def build_archive(r2_client, photos, concurrency=archive.ARCHIVE_FETCH_CONCURRENCY):
+    async def collect():
+        return b''.join([
+            chunk async for chunk in stream_photo_archive(r2_client, BUCKET, photos, concurrency)
+        ])
+    return asyncio.run(collect())
+
+
+def extra_ids(extra):
+    ids = []
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, size = struct.unpack_from('<HH', extra, offset)
+        ids.append(header_id)
+        offset += 4 + size
+    return ids
+
+
+@pytest.fixture
+def photos():
+    return [
+        photo("p1", "IMG_0001.jpg", 0),
+        photo("p2", "IMG_0001.jpg", 1),
+        photo("p3", "missing.jpg", 2),
+        photo("p4", "../../etc/IMG_0002.jpg", 3),
+        photo("p5", "IMG_0001.jpg", 4),
+    ]
+
+
+@pytest.fixture
+def r2_client(photos):
+    return FakeR2({
+        item["s3_key"]: f"data for {item['photo_id']}".encode() * (1000 + index)
+        for index, item in enumerate(photos) if item["photo_id"] != "p3"
+    })
+
+
+class TestStreamPhotoArchive:
+    """Read back what stream_photo_archive writes"""
+
+    def test_archive_is_valid(self, r2_client, photos):
+        data = build_archive(r2_client, photos)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.testzip() is None
+
+    def test_duplicate_names_are_made_unique(self, r2_client, photos):
+        data = build_archive(r2_client, photos)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.namelist() == ["IMG_0001.jpg", "IMG_0001-p2.jpg", "IMG_0002.jpg", "IMG_0001-p5.jpg"]
+            assert zf.read("IMG_0001-p5.jpg") == r2_client.objects[photos[4]["s3_key"]]
+
+    def test_missing_object_is_skipped(self, r2_client, photos):
+        data = build_archive(r2_client, photos)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert "missing.jpg" not in zf.namelist()
+            assert len(zf.infolist()) == len(photos) - 1
+
+    def test_entries_carry_zip64_fields(self, r2_client, photos):
+        data = build_archive(r2_client, photos)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                assert info.compress_type == zipfile.ZIP_STORED
+                # Streamed entries put their sizes in a data descriptor
+                assert info.flag_bits & 0x08
+                # Local header: signature, then fixed fields up to the name and extra lengths
+                name_length, extra_length = struct.unpack_from('<HH', data, info.header_offset + 26)
+                extra_start = info.header_offset + 30 + name_length
+                assert ZIP64_EXTRA_ID in extra_ids(data[extra_start:extra_start + extra_length])
+
+    def test_entry_dates_follow_uploads(self, r2_client, photos):
+        data = build_archive(r2_client, photos)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.getinfo("IMG_0002.jpg").date_time == (2025, 6, 1, 12, 3, 0)
+
+    @pytest.mark.parametrize("concurrency", [1, 2, 8])
+    def test_read_ahead_keeps_order(self, r2_client, photos, concurrency):
+        data = build_archive(r2_client, photos, concurrency)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert [zf.read(name) for name in zf.namelist()] == [
+                r2_client.objects[item["s3_key"]] for item in photos if item["photo_id"] != "p3"
+            ]
+
+    def test_empty_event(self):
+        data = build_archive(FakeR2({}), [])
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.namelist() == []
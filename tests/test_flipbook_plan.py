@@ -0,0 +1,216 @@
+"""
+Test suite for flipbook layout planning
+Checks the slot boxes each style plans, that photos keep their aspect ratio,
+and the work estimate, all without fetching or drawing anything
+"""
+import json
+import math
+import os
+import sys
+
+import pytest
+from reportlab.lib.pagesizes import A4, landscape
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from flipbook import (  # noqa: E402
+    FLIPBOOK_STYLES,
+    box_to_pixels,
+    estimate_plan,
+    fit_photo,
+    get_print_settings,
+    plan_flipbook,
+    plan_memory_archive_pages,
+    plan_minimalist_story_pages,
+    plan_typography_collage_pages,
+)
+
+PAGE_WIDTH, PAGE_HEIGHT = landscape(A4)
+
+# Landscape, portrait, square, panorama and unprobed
+SHAPES = [(4000, 3000), (3000, 4000), (2000, 2000), (6000, 1000), (None, None)]
+
+
+def make_photos(count, shapes=SHAPES):
+    photos = []
+    for index in range(count):
+        width, height = shapes[index % len(shapes)]
+        photo = {"photo_id": f"p{index}", "s3_key": f"events/evt_1/photos/device/{index}.jpg"}
+        if width:
+            photo.update(width=width, height=height)
+        photos.append(photo)
+    return photos
+
+
+def slots(pages):
+    return [slot for page in pages for slot in page['slots']]
+
+
+def assert_keeps_aspect(photo, slot):
+    if photo.get('width'):
+        assert slot['width'] / slot['height'] == pytest.approx(photo['width'] / photo['height'])
+
+
+def assert_within_page(slot):
+    assert slot['x'] >= 0 and slot['y'] >= 0
+    assert slot['x'] + slot['width'] <= PAGE_WIDTH + 1e-6
+    assert slot['y'] + slot['height'] <= PAGE_HEIGHT + 1e-6
+
+
+class TestFitPhoto:
+    """Scaling a photo into a box"""
+
+    @pytest.mark.parametrize("photo, box, expected", [
+        ({"width": 4000, "height": 2000}, (100, 100), (100, 50)),
+        ({"width": 2000, "height": 4000}, (100, 100), (50, 100)),
+        ({"width": 3000, "height": 2000}, (300, 200), (300, 200)),
+        ({"width": 300, "height": 200}, (600, 600), (600, 400)),
+        ({"width": 1000, "height": 1000}, (300, 150), (150, 150)),
+    ])
+    def test_fits_inside_box(self, photo, box, expected):
+        assert fit_photo(photo, box) == pytest.approx(expected)
+
+    @pytest.mark.parametrize("photo", [{}, {"width": 4000}, {"width": 0, "height": 3000}])
+    def test_unknown_dimensions_fill_box(self, photo):
+        assert fit_photo(photo, (120, 80)) == (120, 80)
+
+
+class TestMemoryArchive:
+    """Two scattered photos per page, a lone last photo centered"""
+
+    def test_two_photos_per_page(self):
+        pages = plan_memory_archive_pages(make_photos(5), PAGE_WIDTH, PAGE_HEIGHT)
+
+        assert [page['number'] for page in pages] == [1, 2, 3]
+        assert [len(page['slots']) for page in pages] == [2, 2, 1]
+        assert [slot['photo'] for slot in slots(pages)] == [0, 1, 2, 3, 4]
+        assert [slot['photo_id'] for slot in slots(pages)] == ['p0', 'p1', 'p2', 'p3', 'p4']
+
+    def test_slot_boxes(self):
+        photos = make_photos(2, [(None, None)])
+        first, second = plan_memory_archive_pages(photos, PAGE_WIDTH, PAGE_HEIGHT)[0]['slots']
+
+        box = (PAGE_WIDTH * 0.45, PAGE_HEIGHT * 0.65)
+        assert (first['width'], first['height']) == pytest.approx(box)
+        assert (first['x'], first['y']) == pytest.approx((60, PAGE_HEIGHT - box[1] - 70))
+        assert (second['x'], second['y']) == pytest.approx((PAGE_WIDTH - box[0] - 60, 90))
+
+    def test_lone_photo_is_centered(self):
+        photos = make_photos(3, [(None, None)])
+        lone = plan_memory_archive_pages(photos, PAGE_WIDTH, PAGE_HEIGHT)[-1]['slots'][0]
+
+        assert (lone['width'], lone['height']) == pytest.approx((PAGE_WIDTH * 0.7, PAGE_HEIGHT * 0.75))
+        assert lone['x'] + lone['width'] / 2 == pytest.approx(PAGE_WIDTH / 2)
+        assert lone['y'] + lone['height'] / 2 == pytest.approx(PAGE_HEIGHT / 2)
+
+    def test_keeps_aspect_ratio(self):
+        photos = make_photos(10)
+        for photo, slot in zip(photos, slots(plan_memory_archive_pages(photos, PAGE_WIDTH, PAGE_HEIGHT))):
+            assert_keeps_aspect(photo, slot)
+            assert slot['width'] <= PAGE_WIDTH * 0.7 + 1e-6
+            assert slot['height'] <= PAGE_HEIGHT * 0.75 + 1e-6
+
+
+class TestTypographyCollage:
+    """Four photos per page, each centered in its grid cell"""
+
+    def test_four_photos_per_page(self):
+        pages = plan_typography_collage_pages(make_photos(9), PAGE_WIDTH, PAGE_HEIGHT)
+
+        assert [len(page['slots']) for page in pages] == [4, 4, 1]
+        assert [slot['photo'] for slot in slots(pages)] == list(range(9))
+
+    def test_backgrounds_and_overlays_cycle(self):
+        pages = plan_typography_collage_pages(make_photos(4 * 7), PAGE_WIDTH, PAGE_HEIGHT)
+
+        assert [page['background'] for page in pages[:5]] == ['#fbbf24', '#f97316', '#ef4444', '#8b5cf6', '#fbbf24']
+        assert [page['overlay_text'] for page in pages] == ["LOVE", "JOY", "LIFE", "FUN", "EPIC", "WOW", "LOVE"]
+
+    def test_centered_in_cells(self):
+        margin = 30
+        cell_w = (PAGE_WIDTH - margin * 3) / 2
+        cell_h = (PAGE_HEIGHT - margin * 3) / 2 - 20
+        cells = [
+            (margin, PAGE_HEIGHT / 2 + 20),
+            (PAGE_WIDTH / 2 + margin / 2, PAGE_HEIGHT / 2 + 20),
+            (margin, margin + 30),
+            (PAGE_WIDTH / 2 + margin / 2, margin + 30),
+        ]
+        photos = make_photos(4)
+        page = plan_typography_collage_pages(photos, PAGE_WIDTH, PAGE_HEIGHT)[0]
+
+        for photo, slot, (cell_x, cell_y) in zip(photos, page['slots'], cells):
+            assert_keeps_aspect(photo, slot)
+            assert slot['width'] <= cell_w + 1e-6 and slot['height'] <= cell_h + 1e-6
+            assert slot['x'] + slot['width'] / 2 == pytest.approx(cell_x + cell_w / 2)
+            assert slot['y'] + slot['height'] / 2 == pytest.approx(cell_y + cell_h / 2)
+
+
+class TestMinimalistStory:
+    """One large centered photo per page"""
+
+    def test_one_photo_per_page(self):
+        pages = plan_minimalist_story_pages(make_photos(6), PAGE_WIDTH, PAGE_HEIGHT)
+
+        assert [page['number'] for page in pages] == [1, 2, 3, 4, 5, 6]
+        assert all(len(page['slots']) == 1 for page in pages)
+        assert all(page['photo_count'] == 6 for page in pages)
+
+    def test_centered_and_fitted(self):
+        photos = make_photos(5)
+        max_w = PAGE_WIDTH - 120
+        max_h = PAGE_HEIGHT - 160
+
+        for photo, slot in zip(photos, slots(plan_minimalist_story_pages(photos, PAGE_WIDTH, PAGE_HEIGHT))):
+            assert_keeps_aspect(photo, slot)
+            assert slot['width'] == pytest.approx(max_w) or slot['height'] == pytest.approx(max_h)
+            assert slot['x'] + slot['width'] / 2 == pytest.approx(PAGE_WIDTH / 2)
+            assert slot['y'] + slot['height'] / 2 == pytest.approx(PAGE_HEIGHT / 2 + 10)
+
+
+class TestPlanFlipbook:
+    """The whole plan and its work estimate"""
+
+    EVENT = {"name": "Summer Party", "date": "2025-06-01"}
+
+    @pytest.mark.parametrize("style", list(FLIPBOOK_STYLES))
+    def test_slots_stay_on_page(self, style):
+        plan = plan_flipbook({**self.EVENT, "flipbook_style": style}, make_photos(11))
+
+        assert plan['style'] == style
+        assert plan['photo_count'] == 11
+        assert [slot['photo'] for slot in slots(plan['pages'])] == list(range(11))
+        for slot in slots(plan['pages']):
+            assert_within_page(slot)
+
+    @pytest.mark.parametrize("style", list(FLIPBOOK_STYLES))
+    def test_plan_is_json(self, style):
+        plan = plan_flipbook({**self.EVENT, "flipbook_style": style}, make_photos(7))
+
+        assert json.loads(json.dumps(plan)) == plan
+
+    def test_unknown_style_falls_back(self):
+        plan = plan_flipbook({**self.EVENT, "flipbook_style": "vaporwave"}, make_photos(3))
+
+        assert plan['style'] == 'memory_archive'
+        assert plan['event'] == self.EVENT
+        assert plan['page_size'] == [PAGE_WIDTH, PAGE_HEIGHT]
+
+    @pytest.mark.parametrize("style", list(FLIPBOOK_STYLES))
+    def test_estimate(self, style):
+        plan = plan_flipbook({**self.EVENT, "flipbook_style": style}, make_photos(9))
+        dpi = get_print_settings(style)['dpi']
+        pixels = sum(
+            math.prod(box_to_pixels((slot['width'], slot['height']), dpi))
+            for slot in slots(plan['pages'])
+        )
+
+        assert estimate_plan(plan) == {
+            "pages": len(plan['pages']) + 2,
+            "photos": 9,
+            "megapixels": round(pixels / 1_000_000, 1)
+        }
+
+    def test_box_to_pixels(self):
+        assert box_to_pixels((72, 36), 300) == (300, 150)
+        assert box_to_pixels((0, 0.1), 150) == (1, 1)
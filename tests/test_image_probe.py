@@ -0,0 +1,183 @@
+"""
+Test suite for the image header probes
+Checks dimensions and EXIF orientation against what PIL reports for the same
+files, and that headers cut short give None rather than a wrong answer
+"""
+import io
+import os
+import struct
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from image_probe import (  # noqa: E402
+    EXIF_ORIENTATION_TAG,
+    ImageInfo,
+    _exif_orientation,
+    decode_image_info,
+    probe_image,
+    probe_jpeg,
+    probe_png,
+    probe_webp,
+)
+
+WIDTH = 320
+HEIGHT = 200
+
+
+def encode(fmt, orientation=None, size=(WIDTH, HEIGHT), **params):
+    img = Image.new('RGB', size, (180, 40, 90))
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = orientation
+        params['exif'] = exif.tobytes()
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def displayed(fmt, orientation):
+    if orientation in (5, 6, 7, 8):
+        return ImageInfo(fmt, HEIGHT, WIDTH, orientation)
+    return ImageInfo(fmt, WIDTH, HEIGHT, orientation)
+
+
+def tiff(order, entries):
+    """A minimal TIFF header with one IFD of (tag, type, count, value) entries"""
+    prefix = '<' if order == b'II' else '>'
+    data = order + struct.pack(prefix + 'HI', 42, 8) + struct.pack(prefix + 'H', len(entries))
+    for tag, field_type, count, value in entries:
+        data += struct.pack(prefix + 'HHIHH', tag, field_type, count, value, 0)
+    return data + struct.pack(prefix + 'I', 0)
+
+
+class TestProbeJpeg:
+    """Baseline and progressive JPEGs, with and without a rotation"""
+
+    @pytest.mark.parametrize("progressive", [False, True])
+    @pytest.mark.parametrize("orientation", [1, 6])
+    def test_matches_pil(self, progressive, orientation):
+        data = encode('JPEG', orientation, progressive=progressive)
+
+        assert probe_jpeg(data) == displayed('jpeg', orientation)
+        assert probe_jpeg(data) == decode_image_info(data)
+
+    def test_without_exif(self):
+        assert probe_jpeg(encode('JPEG')) == displayed('jpeg', 1)
+
+    def test_frame_header_past_a_large_segment(self):
+        data = encode('JPEG', 6, icc_profile=b'\0' * 100000)
+
+        assert probe_jpeg(data) == displayed('jpeg', 6)
+
+    def test_truncated_before_frame_header(self):
+        data = encode('JPEG', 6)
+        sof = data.index(b'\xff\xc0')
+
+        assert probe_jpeg(data[:sof]) is None
+        assert probe_jpeg(data[:sof + 6]) is None
+
+    def test_not_a_jpeg(self):
+        assert probe_jpeg(encode('PNG')) is None
+
+
+class TestProbePng:
+    """PNG size from IHDR and orientation from an eXIf chunk"""
+
+    @pytest.mark.parametrize("orientation", [1, 6])
+    def test_matches_pil(self, orientation):
+        data = encode('PNG', orientation)
+
+        assert probe_png(data) == displayed('png', orientation)
+        assert probe_png(data) == decode_image_info(data)
+
+    def test_without_exif(self):
+        assert probe_png(encode('PNG')) == displayed('png', 1)
+
+    def test_truncated_header(self):
+        assert probe_png(encode('PNG')[:20]) is None
+
+    def test_truncated_exif_chunk(self):
+        data = encode('PNG', 6)
+        exif = data.index(b'eXIf')
+
+        assert probe_png(data[:exif + 8]) is None
+
+
+class TestProbeWebp:
+    """Lossy, lossless and extended WebP headers"""
+
+    @pytest.mark.parametrize("lossless", [False, True])
+    def test_matches_pil(self, lossless):
+        data = encode('WEBP', lossless=lossless)
+
+        assert probe_webp(data) == displayed('webp', 1)
+        assert probe_webp(data) == decode_image_info(data)
+
+    @pytest.mark.parametrize("lossless", [False, True])
+    @pytest.mark.parametrize("orientation", [1, 6])
+    def test_with_exif(self, lossless, orientation):
+        data = encode('WEBP', orientation, lossless=lossless)
+
+        assert data[12:16] == b'VP8X'
+        assert probe_webp(data) == displayed('webp', orientation)
+        assert probe_webp(data) == decode_image_info(data)
+
+    def test_odd_sizes(self):
+        data = encode('WEBP', size=(WIDTH + 1, HEIGHT + 1), lossless=True)
+
+        assert probe_webp(data) == ImageInfo('webp', WIDTH + 1, HEIGHT + 1, 1)
+
+    def test_truncated_header(self):
+        assert probe_webp(encode('WEBP')[:29]) is None
+
+    def test_exif_out_of_reach(self):
+        data = encode('WEBP', 6)
+        exif = data.index(b'EXIF')
+
+        assert probe_webp(data[:exif]) is None
+        assert probe_webp(data[:exif + 12]) is None
+
+
+class TestExifOrientation:
+    """Orientation tag from a bare TIFF block"""
+
+    @pytest.mark.parametrize("order", [b'II', b'MM'])
+    @pytest.mark.parametrize("orientation", [1, 3, 6, 8])
+    def test_byte_orders(self, order, orientation):
+        block = tiff(order, [(0x010F, 2, 1, 0), (EXIF_ORIENTATION_TAG, 3, 1, orientation)])
+
+        assert _exif_orientation(block) == orientation
+
+    def test_pil_exif_block(self):
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = 6
+
+        assert _exif_orientation(exif.tobytes()[6:]) == 6
+
+    @pytest.mark.parametrize("block", [
+        b'',
+        b'XX\x00\x2a\x00\x00\x00\x08',
+        tiff(b'II', [(0x010F, 2, 1, 0)]),
+        tiff(b'II', [(EXIF_ORIENTATION_TAG, 3, 1, 9)]),
+        tiff(b'MM', [(EXIF_ORIENTATION_TAG, 3, 1, 6)])[:14],
+        b'II\x2a\x00\xff\xff\x00\x00',
+    ])
+    def test_absent_or_malformed(self, block):
+        assert _exif_orientation(block) == 1
+
+
+class TestProbeImage:
+    """Dispatch on the file signature"""
+
+    @pytest.mark.parametrize("fmt", ['JPEG', 'PNG', 'WEBP'])
+    def test_dispatch(self, fmt):
+        data = encode(fmt, 6)
+
+        assert probe_image(data) == displayed(fmt.lower(), 6)
+
+    def test_unknown_format(self):
+        assert probe_image(encode('GIF')) is None
@@ -231,7 +231,10 @@ class TestGetEventPhotosWithNotes:
         )
         
         assert response.status_code == 200
-        photos = response.json()
+        data = response.json()
+        assert "next_cursor" in data
+        assert "total" in data
+        photos = data["photos"]
         assert isinstance(photos, list)
         assert len(photos) > 0
         
@@ -0,0 +1,92 @@
+"""
+Test suite for the local presigned URL signer
+Checks that its GET URLs are byte-for-byte what botocore generates
+"""
+import os
+import sys
+from datetime import datetime, timezone
+from unittest import mock
+
+import boto3
+import botocore.auth
+import pytest
+from botocore.config import Config
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from presign import UrlSigner  # noqa: E402
+
+ENDPOINT_URL = 'https://0123456789abcdef.r2.cloudflarestorage.com'
+ACCESS_KEY = 'test-access-key'
+SECRET_KEY = 'test/secret+key'
+BUCKET = 'event-photos'
+
+
+@pytest.fixture(scope="module")
+def boto_client():
+    return boto3.client(
+        's3',
+        endpoint_url=ENDPOINT_URL,
+        aws_access_key_id=ACCESS_KEY,
+        aws_secret_access_key=SECRET_KEY,
+        region_name='auto',
+        config=Config(signature_version='s3v4')
+    )
+
+
+def botocore_url(client, key, now, expires_in=3600, disposition=None):
+    params = {'Bucket': BUCKET, 'Key': key}
+    if disposition is not None:
+        params['ResponseContentDisposition'] = disposition
+    # botocore signs with a naive UTC datetime
+    with mock.patch.object(botocore.auth, 'get_current_datetime', return_value=now.replace(tzinfo=None)):
+        return client.generate_presigned_url(ClientMethod='get_object', Params=params, ExpiresIn=expires_in)
+
+
+class TestUrlSigner:
+    """Compare UrlSigner.presign_get with botocore's generate_presigned_url"""
+
+    @pytest.mark.parametrize("key", [
+        "events/evt_1/photos/device/1700000000000-IMG_0001.jpg",
+        "events/evt_1/photos/device/1700000000000-my photo (1).jpg",
+        "events/evt_1/photos/device/1700000000000-a+b=c&d;e,f!g'h*i~j.jpg",
+        "events/evt_1/photos/device/1700000000000-fête ü 写真.jpeg",
+        "events/evt_1//double/slash/../dots.jpg",
+    ])
+    def test_matches_botocore_for_keys(self, boto_client, key):
+        now = datetime(2025, 6, 1, 12, 30, 45, tzinfo=timezone.utc)
+        signer = UrlSigner(ENDPOINT_URL, ACCESS_KEY, SECRET_KEY, 'auto')
+
+        assert signer.presign_get(BUCKET, key, now=now) == botocore_url(boto_client, key, now)
+
+    @pytest.mark.parametrize("filename", [
+        "photo.jpg",
+        "my photo.jpg",
+        'quote"d.jpg',
+        "fête.jpg",
+    ])
+    def test_matches_botocore_with_content_disposition(self, boto_client, filename):
+        now = datetime(2025, 6, 1, 23, 59, 59, tzinfo=timezone.utc)
+        signer = UrlSigner(ENDPOINT_URL, ACCESS_KEY, SECRET_KEY, 'auto')
+        key = f"events/evt_1/photos/device/{filename}"
+        disposition = f'attachment; filename="{filename}"'
+
+        expected = botocore_url(boto_client, key, now, expires_in=600, disposition=disposition)
+        actual = signer.presign_get(
+            BUCKET, key, expires_in=600,
+            params={'response-content-disposition': disposition},
+            now=now
+        )
+        assert actual == expected
+
+    def test_signing_key_follows_date(self, boto_client):
+        """The cached signing key must be re-derived when the day changes"""
+        signer = UrlSigner(ENDPOINT_URL, ACCESS_KEY, SECRET_KEY, 'auto')
+        key = "events/evt_1/photos/device/photo.jpg"
+
+        for now in [
+            datetime(2025, 6, 1, 23, 59, 59, tzinfo=timezone.utc),
+            datetime(2025, 6, 2, 0, 0, 0, tzinfo=timezone.utc),
+            datetime(2025, 6, 1, 12, 0, 0, tzinfo=timezone.utc),
+        ]:
+            assert signer.presign_get(BUCKET, key, now=now) == botocore_url(boto_client, key, now)